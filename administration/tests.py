@@ -6,22 +6,36 @@ TESTS.PY - Tests de l'application Administration
 Tests couverts :
     - Decorateur : admin_required, is_admin
     - Routeur DB : DatabaseRouter
-    - Vues : acces dashboard, commandes, utilisateurs, inscription
+    - Filtres : preparer_filtres, preparer_filtres_client, appliquer_filtres,
+      construire_index_tags
+    - Vues : acces dashboard, commandes, utilisateurs, inscription,
+      restauration d'une commande ou d'un utilisateur supprime (sans
+      nouvel EDI)
     - Controle d'acces : clients non-admin rediriges
 
 Projet : Extranet Giffaud Groupe
 =============================================================================
 """
+from copy import deepcopy
 from decimal import Decimal
+from types import SimpleNamespace
 from unittest.mock import patch, MagicMock
 
+from django.core.cache import cache
 from django.test import TestCase
 from django.contrib.auth.models import User, AnonymousUser
 from django.urls import reverse
+from django.utils import timezone
 
-from clients.models import Utilisateur
-from commandes.models import Commande
+from catalogue.services import get_catalogue_client
+from clients.models import Utilisateur, UtilisateurSupprime
+from commandes.models import Commande, CommandeSupprimee
+from commandes.tasks import regenerer_edi_en_attente
 from .views.utils.decorators import is_admin
+from catalogue.filtres import _ajouter_tags_auto
+from .views.utils.filtres import (
+    preparer_filtres, preparer_filtres_client, appliquer_filtres, construire_index_tags,
+)
 from extranet.db_router import DatabaseRouter
 
 
@@ -108,6 +122,87 @@ class DatabaseRouterTest(TestCase):
         self.assertFalse(result)
 
 
+# =============================================================================
+# TESTS DES FILTRES PRODUITS
+# =============================================================================
+
+class FiltresProduitsTest(TestCase):
+    """Tests de la préparation et de l'application des filtres produits."""
+
+    def setUp(self):
+        self.produits = [
+            {'prod': 'P1', 'libelle': 'Rôti Dupont', 'tags': []},
+            {'prod': 'P2', 'libelle': 'Saucisse Dupont', 'tags': []},
+            {'prod': 'P3', 'libelle': 'Terrine Dupont', 'tags': []},
+            {'prod': 'P4', 'libelle': 'Jambon', 'tags': []},
+        ]
+
+    def test_tags_automatiques(self):
+        produits, filtres_groupes, tags = preparer_filtres(self.produits, use_cache=False)
+        self.assertIn('auto_dupont', produits[0]['tags'])
+        self.assertNotIn('auto_dupont', produits[3]['tags'])
+        self.assertIn('auto_dupont', tags)
+        self.assertIn('auto_dupont', filtres_groupes['Filtres personnalisés'])
+
+    def test_tags_automatiques_termes_imbriques(self):
+        filtres_auto = {
+            'auto_saucisse': {'label': 'Saucisse', 'termes': ['saucisse']},
+            'auto_sauc': {'label': 'Sauc', 'termes': ['sauc']},
+            'auto_dupont': {'label': 'Dupont', 'termes': ['dupont']},
+        }
+        produits = [dict(p) for p in self.produits]
+        _ajouter_tags_auto(produits, filtres_auto)
+        # Termes contenus l'un dans l'autre trouvés tous les deux, dans l'ordre des filtres
+        self.assertEqual(produits[1]['tags'], ['auto_saucisse', 'auto_sauc', 'auto_dupont'])
+        self.assertEqual(produits[3]['tags'], [])
+        # Les listes d'origine ne sont pas modifiées
+        self.assertEqual(self.produits[1]['tags'], [])
+
+    def test_appliquer_filtres(self):
+        produits, _, _ = preparer_filtres(self.produits, use_cache=False)
+        resultat = appliquer_filtres(produits, ['auto_dupont'], query='sau')
+        self.assertEqual([p['prod'] for p in resultat], ['P2'])
+
+    def test_recherche_libelle_et_code(self):
+        self.assertEqual([p['prod'] for p in appliquer_filtres(self.produits, [], 'p4')], ['P4'])
+        self.assertEqual([p['prod'] for p in appliquer_filtres(self.produits, [], 'JAMB')], ['P4'])
+        # Pas de correspondance à cheval sur le libellé et le code
+        self.assertEqual(appliquer_filtres(self.produits, [], 'bonp4'), [])
+
+    def test_appliquer_filtres_avec_index(self):
+        produits, _, _ = preparer_filtres(self.produits, use_cache=False)
+        index_tags = construire_index_tags(produits)
+        self.assertEqual(index_tags['auto_dupont'], frozenset({'P1', 'P2', 'P3'}))
+        for filtres in (['auto_dupont'], ['auto_dupont', 'inconnu'], ['inconnu']):
+            self.assertEqual(
+                appliquer_filtres(produits, filtres, index_tags=index_tags),
+                appliquer_filtres(produits, filtres),
+            )
+
+    def test_preparer_filtres_client_en_cache(self):
+        cache.clear()
+        utilisateur = SimpleNamespace(code_tiers='C001')
+        with patch('catalogue.services._charger_produits_client',
+                   side_effect=lambda code_tiers: deepcopy(self.produits)) as mock_produits:
+            produits, filtres_groupes, index_tags = preparer_filtres_client(utilisateur)
+            preparer_filtres_client(SimpleNamespace(code_tiers='C001'))
+        self.assertEqual(mock_produits.call_count, 1)
+        self.assertIn('auto_dupont', filtres_groupes['Filtres personnalisés'])
+        self.assertEqual(index_tags['auto_dupont'], frozenset({'P1', 'P2', 'P3'}))
+        self.assertIn('auto_dupont', produits[0]['tags'])
+
+    def test_preparer_filtres_client_autre_seuil_sans_modifier_catalogue(self):
+        cache.clear()
+        utilisateur = SimpleNamespace(code_tiers='C001')
+        with patch('catalogue.services._charger_produits_client',
+                   side_effect=lambda code_tiers: deepcopy(self.produits)):
+            catalogue = get_catalogue_client(utilisateur)
+            tags_avant = [list(p['tags']) for p in catalogue['produits']]
+            produits, _, _ = preparer_filtres_client(utilisateur, seuil_occurrences=2)
+        self.assertEqual([p['tags'] for p in catalogue['produits']], tags_avant)
+        self.assertIsNot(produits[0], catalogue['produits'][0])
+
+
 # =============================================================================
 # TESTS D'ACCES AUX VUES ADMIN
 # =============================================================================
@@ -192,3 +287,106 @@ class AdminAccesAdminTest(TestCase):
     def test_mentions_legales_accessible(self):
         response = self.client.get(reverse('administration:mentions_legales_admin'))
         self.assertEqual(response.status_code, 200)
+
+
+class RestaurerCommandeTest(TestCase):
+    """Tests : restauration d'une commande supprimee et de ses lignes."""
+
+    def setUp(self):
+        creer_admin()
+        self.client.login(username='admin1', password='adminpass1234')
+        _, self.utilisateur = creer_utilisateur()
+        maintenant = timezone.now()
+        self.archive = CommandeSupprimee.objects.create(
+            utilisateur=self.utilisateur,
+            numero='CMD-20260212-9999',
+            date_commande=maintenant,
+            date_generation_edi=maintenant,
+            total_ht=Decimal('21.00'),
+            lignes_json=[
+                {'reference_produit': 'P1', 'nom_produit': 'Saucisse', 'quantite': 2,
+                 'prix_unitaire': '5.00', 'total_ligne': '10.00'},
+                {'reference_produit': 'P2', 'nom_produit': 'Jambon', 'quantite': 1,
+                 'prix_unitaire': '11.00', 'total_ligne': '11.00'},
+            ],
+        )
+
+    def test_restauration_lignes(self):
+        response = self.client.post(
+            reverse('administration:restaurer_commande', args=[self.archive.id])
+        )
+        self.assertEqual(response.status_code, 302)
+        commande = Commande.objects.get(numero='CMD-20260212-9999')
+        lignes = {l.reference_produit: l for l in commande.lignes.all()}
+        self.assertEqual(sorted(lignes), ['P1', 'P2'])
+        self.assertEqual(lignes['P1'].total_ligne, Decimal('10.00'))
+        self.assertFalse(CommandeSupprimee.objects.exists())
+
+    @patch('commandes.tasks.generer_csv_edi')
+    def test_restauration_sans_nouvel_edi(self, mock_generer):
+        self.client.post(reverse('administration:restaurer_commande', args=[self.archive.id]))
+        commande = Commande.objects.get(numero='CMD-20260212-9999')
+        self.assertEqual(commande.date_generation_edi, self.archive.date_generation_edi)
+        self.assertEqual(regenerer_edi_en_attente(), (0, 0))
+        mock_generer.assert_not_called()
+
+    @patch('administration.views.commandes.restaurer_commande.lancer_generation_edi')
+    def test_suppression_et_restauration_edi_en_attente(self, mock_lancer):
+        commande = Commande.objects.create(
+            utilisateur=self.utilisateur, numero='CMD-20260212-7777', total_ht=Decimal('5.00')
+        )
+        self.client.post(reverse('administration:supprimer_commande', args=[commande.id]))
+        archive = CommandeSupprimee.objects.get(numero='CMD-20260212-7777')
+        self.assertIsNone(archive.date_generation_edi)
+
+        self.client.post(reverse('administration:restaurer_commande', args=[archive.id]))
+        restauree = Commande.objects.get(numero='CMD-20260212-7777')
+        # EDI jamais écrit : la commande reste à générer et une tentative est relancée
+        self.assertIsNone(restauree.date_generation_edi)
+        mock_lancer.assert_called_once_with(restauree.id)
+
+
+class RestaurerUtilisateurTest(TestCase):
+    """Tests : restauration d'un utilisateur supprime et de ses commandes."""
+
+    def setUp(self):
+        creer_admin()
+        self.client.login(username='admin1', password='adminpass1234')
+        self.archive = UtilisateurSupprime.objects.create(
+            username='supprime1',
+            password_hash='hash123',
+            email='supp@test.com',
+            code_tiers='CLI999',
+            nom_client='Client Test',
+            date_joined=timezone.now(),
+            commandes_json=[{
+                'numero': 'CMD-20260212-8888',
+                'date_commande': timezone.now().isoformat(),
+                'total_ht': '10.00',
+                'lignes': [
+                    {'reference_produit': 'P1', 'nom_produit': 'Saucisse', 'quantite': 2,
+                     'prix_unitaire': '5.00', 'total_ligne': '10.00'},
+                ],
+            }],
+        )
+
+    @patch('commandes.tasks.generer_csv_edi')
+    def test_restauration_commandes_sans_nouvel_edi(self, mock_generer):
+        response = self.client.post(
+            reverse('administration:restaurer_utilisateur', args=[self.archive.id])
+        )
+        self.assertEqual(response.status_code, 302)
+        commande = Commande.objects.get(numero='CMD-20260212-8888')
+        # Archive sans état EDI : EDI considéré comme déjà envoyé
+        self.assertEqual(commande.date_generation_edi, commande.date_commande)
+        self.assertEqual(regenerer_edi_en_attente(), (0, 0))
+        mock_generer.assert_not_called()
+
+    @patch('administration.views.utilisateurs.restaurer_utilisateur.lancer_generation_edi')
+    def test_restauration_commande_edi_en_attente(self, mock_lancer):
+        self.archive.commandes_json[0]['date_generation_edi'] = None
+        self.archive.save()
+        self.client.post(reverse('administration:restaurer_utilisateur', args=[self.archive.id]))
+        commande = Commande.objects.get(numero='CMD-20260212-8888')
+        self.assertIsNone(commande.date_generation_edi)
+        mock_lancer.assert_called_once_with(commande.id)
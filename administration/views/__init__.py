@@ -24,7 +24,7 @@ Projet : Extranet Giffaud Groupe
 # UTILITAIRES ET DÉCORATEURS
 # =============================================================================
 from .utils import admin_required, is_admin, EDI_OUTPUT_DIR
-from .utils import preparer_filtres, appliquer_filtres
+from .utils import preparer_filtres, preparer_filtres_client, appliquer_filtres, construire_index_tags
 
 # =============================================================================
 # DASHBOARD
@@ -84,7 +84,9 @@ __all__ = [
     'is_admin',
     'EDI_OUTPUT_DIR',
     'preparer_filtres',
+    'preparer_filtres_client',
     'appliquer_filtres',
+    'construire_index_tags',
     # Dashboard
     'dashboard',
     # Commandes
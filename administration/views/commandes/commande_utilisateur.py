@@ -11,6 +11,7 @@ Projet : Extranet Giffaud Groupe
 """
 from django.shortcuts import render, get_object_or_404
 from django.db import connections
+from django.db.models import Count
 
 from clients.models import Utilisateur
 from commandes.models import Commande
@@ -68,7 +69,13 @@ def commande_utilisateur(request, utilisateur_id):
     # RÉCUPÉRATION DES COMMANDES
     # =========================================================================
     # Limiter aux 50 dernières pour les performances
-    commandes = Commande.objects.filter(utilisateur=utilisateur).order_by('-date_commande')[:50]
+    # (nombre de lignes agrégé dans la même requête)
+    commandes = (
+        Commande.objects
+        .filter(utilisateur=utilisateur)
+        .annotate(nb_lignes=Count('lignes'))
+        .order_by('-date_commande')[:50]
+    )
 
     context = {
         'page_title': f'Commandes - {nom_client}',
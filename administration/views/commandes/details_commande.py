@@ -35,8 +35,13 @@ def details_commande(request, commande_id):
     Raises:
         Commande.DoesNotExist: Si l'ID de commande n'existe pas
     """
-    # Récupérer la commande par son ID
-    commande = Commande.objects.get(id=commande_id)
+    # Récupérer la commande par son ID, avec son utilisateur et ses lignes
+    commande = (
+        Commande.objects
+        .select_related('utilisateur')
+        .prefetch_related('lignes')
+        .get(id=commande_id)
+    )
 
     # Récupérer les informations du client depuis la base distante
     client = commande.utilisateur.get_client_distant()
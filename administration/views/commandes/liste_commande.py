@@ -15,8 +15,9 @@ Projet : Extranet Giffaud Groupe
 =============================================================================
 """
 from django.shortcuts import render
-from django.db.models import Q
+from django.db.models import Count, Q
 
+from clients.models import Utilisateur
 from commandes.models import Commande
 from ..utils.decorators import admin_required
 
@@ -42,8 +43,15 @@ def liste_commande(request):
             - commandes : Liste des commandes enrichies du nom client
             - query : Le terme de recherche saisi
     """
-    # Récupérer toutes les commandes, triées par date décroissante
-    commandes = Commande.objects.all().order_by('-date_commande')
+    # Récupérer toutes les commandes, triées par date décroissante, avec leur
+    # utilisateur (jointure) et leur nombre de lignes (agrégat) : aucune
+    # requête supplémentaire par commande affichée
+    commandes = (
+        Commande.objects
+        .select_related('utilisateur')
+        .annotate(nb_lignes=Count('lignes'))
+        .order_by('-date_commande')
+    )
 
     # Appliquer la recherche si un terme est fourni
     query = request.GET.get('q', '')
@@ -54,9 +62,11 @@ def liste_commande(request):
         )
 
     # Limiter aux 50 premières pour optimiser les performances
-    commandes = commandes[:50]
+    commandes = list(commandes[:50])
 
     # Enrichir chaque commande avec le nom du client depuis la base distante
+    # (clients absents du cache chargés en une seule requête)
+    Utilisateur.precharger_clients_distants(c.utilisateur for c in commandes)
     commandes_avec_client = []
     for commande in commandes:
         client = commande.utilisateur.get_client_distant()
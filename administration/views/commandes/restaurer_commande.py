@@ -10,7 +10,8 @@ Processus :
 1. Vérification que le délai n'est pas dépassé
 2. Recréation de la commande avec ses données originales
 3. Recréation de toutes les lignes de commande
-4. Suppression de l'archive
+4. Relance de la génération EDI si elle n'avait pas abouti
+5. Suppression de l'archive
 
 Projet : Extranet Giffaud Groupe
 =============================================================================
@@ -19,9 +20,12 @@ from decimal import Decimal
 
 from django.shortcuts import redirect, get_object_or_404
 from django.contrib import messages
+from django.db import transaction
 from django.views.decorators.http import require_POST
 
+from catalogue.services import invalider_top_references
 from commandes.models import Commande, CommandeSupprimee, LigneCommande
+from commandes.tasks import lancer_generation_edi
 from ..utils.decorators import admin_required
 
 
@@ -62,31 +66,48 @@ def restaurer_commande(request, commande_supprimee_id):
     # =========================================================================
     # RECRÉATION DE LA COMMANDE
     # =========================================================================
-    commande = Commande.objects.create(
-        utilisateur=commande_supprimee.utilisateur,
-        numero=commande_supprimee.numero,
-        date_livraison=commande_supprimee.date_livraison,
-        date_depart_camions=commande_supprimee.date_depart_camions,
-        total_ht=commande_supprimee.total_ht,
-        commentaire=commande_supprimee.commentaire,
-    )
-
-    # Restaurer la date de commande originale (contourne auto_now_add)
-    Commande.objects.filter(id=commande.id).update(date_commande=commande_supprimee.date_commande)
+    # La commande et ses lignes sont recréées dans une seule transaction
+    with transaction.atomic():
+        commande = Commande.objects.create(
+            utilisateur=commande_supprimee.utilisateur,
+            numero=commande_supprimee.numero,
+            date_livraison=commande_supprimee.date_livraison,
+            date_depart_camions=commande_supprimee.date_depart_camions,
+            total_ht=commande_supprimee.total_ht,
+            commentaire=commande_supprimee.commentaire,
+        )
 
-    # =========================================================================
-    # RECRÉATION DES LIGNES DE COMMANDE
-    # =========================================================================
-    for ligne_data in commande_supprimee.lignes_json:
-        LigneCommande.objects.create(
-            commande=commande,
-            reference_produit=ligne_data['reference_produit'],
-            nom_produit=ligne_data['nom_produit'],
-            quantite=ligne_data['quantite'],
-            prix_unitaire=Decimal(ligne_data['prix_unitaire']),
-            total_ligne=Decimal(ligne_data['total_ligne']),
+        # Restaurer la date de commande originale (contourne auto_now_add) et
+        # l'état de son EDI : un EDI déjà reçu par l'ERP n'est pas régénéré
+        Commande.objects.filter(id=commande.id).update(
+            date_commande=commande_supprimee.date_commande,
+            date_generation_edi=commande_supprimee.date_generation_edi,
         )
 
+        # =====================================================================
+        # RECRÉATION DES LIGNES DE COMMANDE
+        # =====================================================================
+        # Un seul INSERT pour toutes les lignes (total_ligne est archivé)
+        LigneCommande.objects.bulk_create([
+            LigneCommande(
+                commande=commande,
+                reference_produit=ligne_data['reference_produit'],
+                nom_produit=ligne_data['nom_produit'],
+                quantite=ligne_data['quantite'],
+                prix_unitaire=Decimal(ligne_data['prix_unitaire']),
+                total_ligne=Decimal(ligne_data['total_ligne']),
+            )
+            for ligne_data in commande_supprimee.lignes_json
+        ], batch_size=500)
+
+        # EDI jamais écrit (génération en attente lors de la suppression) :
+        # nouvelle tentative une fois la commande et ses lignes enregistrées
+        if commande_supprimee.date_generation_edi is None:
+            lancer_generation_edi(commande.id)
+
+    # Les produits favoris du client doivent être recalculés
+    invalider_top_references(commande.utilisateur_id)
+
     # =========================================================================
     # NETTOYAGE
     # =========================================================================
@@ -20,6 +20,7 @@ from django.shortcuts import redirect, get_object_or_404
 from django.contrib import messages
 from django.views.decorators.http import require_POST
 
+from catalogue.services import invalider_top_references
 from commandes.models import Commande, CommandeSupprimee
 from ..utils.decorators import admin_required
 
@@ -75,6 +76,7 @@ def supprimer_commande(request, commande_id):
         date_depart_camions=commande.date_depart_camions,
         total_ht=commande.total_ht,
         commentaire=commande.commentaire,
+        date_generation_edi=commande.date_generation_edi,
         lignes_json=lignes_data,
     )
 
@@ -84,5 +86,8 @@ def supprimer_commande(request, commande_id):
     numero = commande.numero
     commande.delete()  # Cascade sur les LigneCommande
 
+    # Les produits favoris du client doivent être recalculés
+    invalider_top_references(commande.utilisateur_id)
+
     messages.success(request, f'La commande {numero} a été supprimée. Vous pouvez la restaurer pendant 5 minutes depuis le tableau de bord.')
     return redirect('administration:liste_commande')
@@ -94,6 +94,14 @@ def dashboard(request):
     # Liste unifiée de toutes les activités récentes pour affichage chronologique
     activites = []
 
+    # Noms des clients lus sur la base distante en une seule requête
+    # pour les commandes, utilisateurs et commandes supprimées affichés
+    Utilisateur.precharger_clients_distants(
+        [c.utilisateur for c in dernieres_commandes]
+        + list(derniers_utilisateurs)
+        + [cs.utilisateur for cs in commandes_supprimees]
+    )
+
     # Ajouter les nouvelles commandes
     for commande in dernieres_commandes:
         # Récupérer le nom du client depuis la base distante
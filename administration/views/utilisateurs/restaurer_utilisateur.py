@@ -27,6 +27,7 @@ from django.views.decorators.http import require_POST
 
 from clients.models import Utilisateur, UtilisateurSupprime
 from commandes.models import Commande, LigneCommande
+from commandes.tasks import lancer_generation_edi
 from ..utils.decorators import admin_required
 
 
@@ -100,6 +101,9 @@ def restaurer_utilisateur(request, utilisateur_supprime_id):
     # =========================================================================
     # RECRÉATION DES COMMANDES
     # =========================================================================
+    # Les lignes de toutes les commandes sont insérées ensemble à la fin
+    lignes = []
+    edi_en_attente = []
     for commande_data in utilisateur_supprime.commandes_json:
         # Parser les dates depuis le format ISO
         date_commande = datetime.fromisoformat(commande_data['date_commande'])
@@ -109,6 +113,12 @@ def restaurer_utilisateur(request, utilisateur_supprime_id):
         date_depart = None
         if commande_data.get('date_depart_camions'):
             date_depart = datetime.fromisoformat(commande_data['date_depart_camions']).date()
+        # Archives antérieures sans état EDI : EDI considéré comme déjà envoyé
+        date_generation_edi = date_commande
+        if 'date_generation_edi' in commande_data:
+            date_generation_edi = commande_data['date_generation_edi']
+            if date_generation_edi:
+                date_generation_edi = datetime.fromisoformat(date_generation_edi)
 
         # Créer la commande
         commande = Commande.objects.create(
@@ -120,12 +130,18 @@ def restaurer_utilisateur(request, utilisateur_supprime_id):
             commentaire=commande_data.get('commentaire', ''),
         )
 
-        # Restaurer la date de commande originale (contourne auto_now_add)
-        Commande.objects.filter(id=commande.id).update(date_commande=date_commande)
+        # Restaurer la date de commande originale (contourne auto_now_add) et
+        # l'état de son EDI : un EDI déjà reçu par l'ERP n'est pas régénéré
+        Commande.objects.filter(id=commande.id).update(
+            date_commande=date_commande,
+            date_generation_edi=date_generation_edi,
+        )
+        if not date_generation_edi:
+            edi_en_attente.append(commande.id)
 
-        # Recréer les lignes de commande
-        for ligne_data in commande_data.get('lignes', []):
-            LigneCommande.objects.create(
+        # Préparer les lignes de commande (total_ligne est archivé)
+        lignes.extend(
+            LigneCommande(
                 commande=commande,
                 reference_produit=ligne_data['reference_produit'],
                 nom_produit=ligne_data['nom_produit'],
@@ -133,6 +149,16 @@ def restaurer_utilisateur(request, utilisateur_supprime_id):
                 prix_unitaire=Decimal(ligne_data['prix_unitaire']),
                 total_ligne=Decimal(ligne_data['total_ligne']),
             )
+            for ligne_data in commande_data.get('lignes', [])
+        )
+
+    # Recréer toutes les lignes de commande en un seul INSERT
+    LigneCommande.objects.bulk_create(lignes, batch_size=500)
+
+    # EDI jamais écrit (génération en attente lors de la suppression) :
+    # nouvelle tentative maintenant que les lignes sont enregistrées
+    for commande_id in edi_en_attente:
+        lancer_generation_edi(commande_id)
 
     # =========================================================================
     # NETTOYAGE
@@ -86,6 +86,7 @@ def supprimer_utilisateur(request, utilisateur_id):
             'date_depart_camions': commande.date_depart_camions.isoformat() if commande.date_depart_camions else None,
             'total_ht': str(commande.total_ht),
             'commentaire': commande.commentaire,
+            'date_generation_edi': commande.date_generation_edi.isoformat() if commande.date_generation_edi else None,
             'lignes': lignes_data,
         })
 
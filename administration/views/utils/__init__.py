@@ -4,12 +4,14 @@ UTILS - Utilitaires et décorateurs pour les vues administration
 =============================================================================
 """
 from .decorators import admin_required, is_admin, EDI_OUTPUT_DIR
-from .filtres import preparer_filtres, appliquer_filtres
+from .filtres import preparer_filtres, preparer_filtres_client, appliquer_filtres, construire_index_tags
 
 __all__ = [
     'admin_required',
     'is_admin',
     'EDI_OUTPUT_DIR',
     'preparer_filtres',
+    'preparer_filtres_client',
     'appliquer_filtres',
+    'construire_index_tags',
 ]
@@ -12,117 +12,53 @@ Les filtres permettent de :
     - Rechercher par texte dans le libellé ou code produit
 
 Ces fonctions sont utilisées notamment dans la vue du cadencier client.
+La préparation des filtres d'une liste de produits (tags automatiques,
+filtres groupés, index des tags) est définie dans catalogue.filtres.
 
 Projet : Extranet Giffaud Groupe
 =============================================================================
 """
-from django.core.cache import cache
-from catalogue.services import FILTRES_DISPONIBLES, generer_filtres_automatiques, _normaliser
+# preparer_filtres et construire_index_tags sont définis dans catalogue.filtres
+# et restent importables depuis ce module par les vues
+from catalogue.filtres import construire_index_tags, preparer_filtres
+from catalogue.services import (
+    SEUIL_FILTRES_CATALOGUE, get_catalogue_client, get_produits_client, texte_recherche,
+)
 
 
-def _get_cache_key(produits):
-    """Génère une clé de cache basée sur les références produits."""
-    refs = sorted([p.get('reference', p.get('prod', '')) for p in produits])
-    return f"filtres_{hash(tuple(refs))}"
-
-
-def preparer_filtres(produits, seuil_occurrences=3, use_cache=True):
+def preparer_filtres_client(utilisateur, seuil_occurrences=SEUIL_FILTRES_CATALOGUE):
     """
-    Prépare les filtres disponibles pour une liste de produits.
+    Prépare les filtres du catalogue complet d'un client, avec cache.
 
-    Cette fonction analyse les produits et génère deux types de filtres :
-    1. Filtres prédéfinis (définis dans FILTRES_DISPONIBLES)
-    2. Filtres automatiques (générés à partir des libellés des produits)
-
-    Les filtres qui ne correspondent à aucun ou à tous les produits
-    sont automatiquement exclus (inutiles pour le filtrage).
+    Avec le seuil par défaut, les produits tagués, les filtres groupés et
+    l'index inversé des tags sont lus tels quels sur le catalogue du client
+    (catalogue.services.get_catalogue_client) : ils sont conservés dans la
+    même entrée de cache que les produits. Un autre seuil est calculé à la
+    demande sur des copies des produits, sans modifier le catalogue partagé.
 
     Args:
-        produits (list): Liste de dictionnaires représentant les produits.
-                        Chaque produit doit avoir au minimum 'libelle' et 'tags'.
-        seuil_occurrences (int): Nombre minimum de produits devant correspondre
-                                 à un filtre automatique pour qu'il soit affiché.
-                                 Défaut: 3
-        use_cache (bool): Utiliser le cache pour les filtres. Défaut: True
+        utilisateur: Instance Utilisateur (avec code_tiers)
+        seuil_occurrences (int): Seuil des filtres automatiques. Défaut: 3
 
     Returns:
-        tuple: Un triplet contenant :
-            - produits (list): Les produits avec leurs tags mis à jour
-            - filtres_groupes (dict): Filtres groupés par catégorie pour l'affichage
-            - tags_disponibles (set): Ensemble des codes de tags utilisables
+        tuple: (produits, filtres_groupes, index_tags) où index_tags est
+        l'index inversé à passer à appliquer_filtres
     """
-    # Vérifier le cache
-    cache_key = _get_cache_key(produits) if use_cache else None
-    if use_cache:
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            filtres_groupes, tags_disponibles, filtres_auto = cached_data
-            # Réappliquer les tags aux produits
-            for produit in produits:
-                libelle_normalise = _normaliser(produit.get('libelle', '') or '')
-                for code, info in filtres_auto.items():
-                    if any(terme in libelle_normalise for terme in info["termes"]):
-                        if code not in produit.get('tags', []):
-                            produit['tags'].append(code)
-            return produits, filtres_groupes, tags_disponibles
-
-    # Générer les filtres automatiques à partir des libellés des produits
-    # Ces filtres sont créés dynamiquement en analysant les mots-clés récurrents
-    filtres_auto = generer_filtres_automatiques(produits, seuil_occurrences=seuil_occurrences)
-
-    # Ajouter les tags automatiques aux produits
-    # Parcourt chaque produit et lui attribue les tags correspondants
-    for produit in produits:
-        libelle_normalise = _normaliser(produit.get('libelle', '') or '')
-        for code, info in filtres_auto.items():
-            # Si un terme du filtre est présent dans le libellé, ajouter le tag
-            if any(terme in libelle_normalise for terme in info["termes"]):
-                if code not in produit.get('tags', []):
-                    produit['tags'].append(code)
-
-    # Compter les occurrences de chaque tag dans la liste des produits
-    tags_count = {}
-    for p in produits:
-        for tag in p.get('tags', []):
-            tags_count[tag] = tags_count.get(tag, 0) + 1
-
-    # Ne garder que les tags utiles pour le filtrage :
-    # - Plus d'1 produit (sinon trop restrictif)
-    # - Moins que le total (sinon filtre inutile car tous les produits correspondent)
-    total_produits = len(produits)
-    tags_disponibles = {tag for tag, count in tags_count.items() if 1 < count < total_produits}
-
-    # Construire les filtres groupés pour l'affichage dans le template
-    filtres_groupes = {}
-    for groupe, filtres in FILTRES_DISPONIBLES.items():
-        filtres_groupe = {
-            code: info["label"]
-            for code, info in filtres.items()
-            if code in tags_disponibles  # Ne garder que les filtres avec des produits correspondants
-        }
-        # N'ajouter le groupe que s'il contient au moins un filtre actif
-        if filtres_groupe:
-            filtres_groupes[groupe] = filtres_groupe
-
-    # Ajouter les filtres automatiques comme groupe séparé "Filtres personnalisés"
-    if filtres_auto:
-        # Appliquer le même filtre : plus d'1 produit ET moins que le total
-        filtres_auto_valides = {
-            code: info["label"]
-            for code, info in filtres_auto.items()
-            if 1 < tags_count.get(code, 0) < total_produits
-        }
-        if filtres_auto_valides:
-            filtres_groupes["Filtres personnalisés"] = filtres_auto_valides
-
-    # Mettre en cache les résultats (5 minutes)
-    if use_cache and cache_key:
-        cache.set(cache_key, (filtres_groupes, tags_disponibles, filtres_auto), 300)
-
-    return produits, filtres_groupes, tags_disponibles
-
-
-def appliquer_filtres(produits, filtres_actifs, query=''):
+    if seuil_occurrences == SEUIL_FILTRES_CATALOGUE:
+        catalogue = get_catalogue_client(utilisateur)
+        if catalogue is None:
+            return [], {}, {}
+        return catalogue['produits'], catalogue['filtres_groupes'], catalogue['index_tags']
+
+    produits, filtres_groupes, _ = preparer_filtres(
+        [dict(p) for p in get_produits_client(utilisateur)],
+        seuil_occurrences=seuil_occurrences,
+        use_cache=False,
+    )
+    return produits, filtres_groupes, construire_index_tags(produits)
+
+
+def appliquer_filtres(produits, filtres_actifs, query='', index_tags=None):
     """
     Applique les filtres sélectionnés et la recherche textuelle sur les produits.
 
@@ -139,23 +75,38 @@ def appliquer_filtres(produits, filtres_actifs, query=''):
                               Si vide, aucun filtrage par tag n'est appliqué.
         query (str): Texte de recherche (insensible à la casse).
                     Si vide, aucune recherche textuelle n'est appliquée.
+        index_tags (dict): Index inversé issu de construire_index_tags pour
+                    ces produits (optionnel). S'il est fourni, les filtres
+                    actifs sont résolus par union d'ensembles de références.
 
     Returns:
         list: Liste des produits correspondant aux critères de filtrage
     """
-    # Étape 1 : Recherche textuelle (si une requête est fournie)
-    if query:
-        query_lower = query.lower()
-        produits = [p for p in produits if
-                    query_lower in p.get('libelle', '').lower() or  # Recherche dans le libellé
-                    query_lower in p.get('prod', '').lower()]       # Recherche dans le code produit
-
-    # Étape 2 : Filtrage par tags (si des filtres sont actifs)
-    if filtres_actifs:
-        # Garde le produit si au moins un de ses tags est dans les filtres actifs (OR)
-        produits = [
+    # Étape 1 : Résolution des filtres par tags (si des filtres sont actifs)
+    # Garde le produit si au moins un de ses tags est dans les filtres actifs (OR)
+    refs = actifs = None
+    if filtres_actifs and index_tags is not None:
+        refs = frozenset().union(*(index_tags.get(f, ()) for f in filtres_actifs))
+    elif filtres_actifs:
+        actifs = frozenset(filtres_actifs)
+
+    if not query and not filtres_actifs:
+        return produits
+
+    # Étape 2 : Un seul parcours des produits, tags (test le moins coûteux)
+    # puis recherche textuelle dans le libellé et le code produit
+    # (texte en minuscules précalculé pour les produits du catalogue)
+    query_lower = query.lower()
+    if not filtres_actifs:
+        # Recherche seule (cas le plus fréquent) : un seul test par produit
+        return [
             p for p in produits
-            if any(f in p.get('tags', []) for f in filtres_actifs)
+            if query_lower in (p.get('texte_recherche') or texte_recherche(p))
         ]
-
-    return produits
+    return [
+        p for p in produits
+        if (refs is None or p.get('reference', p.get('prod', '')) in refs)
+        and (actifs is None or not actifs.isdisjoint(p.get('tags', [])))
+        and (not query_lower
+             or query_lower in (p.get('texte_recherche') or texte_recherche(p)))
+    ]
@@ -0,0 +1,39 @@
+"""
+=============================================================================
+CONTEXT_PROCESSORS.PY - Processeurs de contexte de l'application Catalogue
+=============================================================================
+
+Fournit aux templates le récapitulatif du panier affiché dans le bandeau
+latéral (catalogue, favoris, recommandations).
+
+Projet : Extranet Giffaud Groupe
+=============================================================================
+"""
+from .services import get_produits_by_references, recap_panier
+
+
+def panier_recap(request):
+    """
+    Context processor pour le récapitulatif du panier (lignes et total).
+
+    Les valeurs sont des fonctions que le template n'appelle qu'à
+    l'utilisation : les pages sans récapitulatif ne lisent pas le
+    catalogue. Le calcul est fait une seule fois par requête et mémorisé
+    sur l'objet request.
+    """
+    if not request.user.is_authenticated:
+        return {}
+
+    def recap():
+        if not hasattr(request, '_recap_panier'):
+            utilisateur = getattr(request.user, 'utilisateur', None)
+            panier = request.session.get('panier', {}) if utilisateur else {}
+            request._recap_panier = recap_panier(
+                panier, get_produits_by_references(utilisateur, panier)
+            )
+        return request._recap_panier
+
+    return {
+        'lignes_panier': lambda: recap()[0],
+        'total_panier': lambda: recap()[1],
+    }
@@ -0,0 +1,591 @@
+"""
+=============================================================================
+FILTRES.PY - Filtres et tags des produits du catalogue
+=============================================================================
+
+Ce module regroupe le vocabulaire et le calcul des filtres produits,
+partagés par le catalogue client et l'administration :
+    - Normalisation des libellés (accents, casse)
+    - Filtres prédéfinis (FILTRES_DISPONIBLES) et tags manuels d'un libellé
+    - Filtres automatiques générés à partir des mots fréquents
+    - Préparation des filtres d'une liste de produits et index des tags
+
+Il ne dépend d'aucun autre module de l'application : les services du
+catalogue l'utilisent pour préparer le catalogue mis en cache.
+
+Projet : Extranet Giffaud Groupe
+=============================================================================
+"""
+import heapq
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+
+from django.core.cache import cache
+
+
+
+# Mots de 3 lettres ou plus (libellés normalisés) pour les filtres automatiques
+_MOTS_RE = re.compile(r'\b[a-z]{3,}\b')
+
+# Table de suppression des diacritiques combinants (U+0300 à U+036F) pour str.translate
+_SANS_DIACRITIQUES = dict.fromkeys(range(0x0300, 0x0370))
+
+
+@lru_cache(maxsize=8192)
+def _normaliser(texte):
+    """Retire les accents et met en minuscule pour la comparaison."""
+    # La plupart des libellés sont déjà en ASCII : rien à décomposer
+    if texte.isascii():
+        return texte.lower()
+    # Vérification rapide (quick check) : inutile de décomposer un texte déjà en NFD
+    if not unicodedata.is_normalized('NFD', texte):
+        texte = unicodedata.normalize('NFD', texte)
+    texte = texte.translate(_SANS_DIACRITIQUES)
+    # Les caractères non décomposables (œ, espace insécable, ’...) sont
+    # retirés comme les autres : le résultat reste en ASCII, comme les
+    # termes comparés par les filtres
+    if not texte.isascii():
+        texte = texte.encode('ascii', 'ignore').decode('ascii')
+    return texte.lower()
+
+
+# Mots à ignorer pour les filtres automatiques
+MOTS_IGNORES = frozenset({
+    # Articles et prépositions
+    'de', 'du', 'des', 'le', 'la', 'les', 'un', 'une', 'au', 'aux', 'en', 'et', 'ou', 'a', 'par',
+    'pour', 'avec', 'sans', 'sur', 'sous', 'dans', 'entre',
+    # Unités et mesures
+    'kg', 'gr', 'g', 'ml', 'cl', 'l', 'pce', 'pcs', 'env', 'environ', 'mini', 'maxi', 'max', 'min',
+    # Nombres
+    '0', '1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '12', '15', '20', '25', '30', '50', '100',
+    # Mots trop génériques
+    'viande', 'piece', 'pieces', 'tranche', 'tranches', 'lot', 'x', 'n', 'type', 'vide', 'col',
+    'demi', 'sup', 'sel', 'sat', 'mensec', 'noir', 'sauc', 'unite', 'vrac', 'colis', 'l', 'lunite','dlc','courte','fine',
+    'psh','skin','petit','pret','cuire',
+    # Mots trop courts ou génériques
+    'court', 'eco', 'cuisine', 'tranch', 'cais', 'grand', 'mere',
+    # Mots associés à bière (brune/blonde)
+    'brune', 'brunes', 'blonde', 'blondes',
+})
+
+
+@lru_cache(maxsize=1)
+def _get_termes_manuels():
+    """Récupère tous les termes déjà couverts par les filtres manuels."""
+    termes = set()
+    for groupe in FILTRES_DISPONIBLES.values():
+        for info in groupe.values():
+            termes.update(info.get("termes", []))
+    return frozenset(termes)
+
+
+def generer_filtres_automatiques(produits, seuil_occurrences=3, top_k=None):
+    """
+    Génère des filtres automatiques à partir des libellés des produits.
+    Exclut les termes déjà couverts par les filtres manuels (approche hybride).
+
+    Args:
+        produits: Liste des produits avec leurs libellés
+        seuil_occurrences: Nombre minimum d'occurrences pour créer un filtre
+        top_k: Nombre maximum de filtres à conserver (les plus fréquents), tous si None
+
+    Returns:
+        Dictionnaire {code: {"label": label, "termes": [termes]}}
+    """
+    # Compter tous les mots significatifs
+    compteur_mots = Counter()
+    # Ensemble de travail réutilisé d'un produit à l'autre
+    mots_uniques = set()
+
+    # Normaliser tous les libellés en une passe, puis extraire les mots
+    libelles_normalises = list(map(_normaliser, [p.get('libelle', '') or '' for p in produits]))
+
+    for libelle_normalise in libelles_normalises:
+        # Garder uniquement les mots de 3+ caractères, une seule fois par produit
+        mots_uniques.clear()
+        mots_uniques.update(_MOTS_RE.findall(libelle_normalise))
+        # Exclure les mots ignorés ET les termes déjà dans les filtres manuels
+        mots_uniques -= _EXCLUSIONS
+        compteur_mots.update(mots_uniques)
+
+    # Créer les filtres pour les mots fréquents
+    filtres_auto = {}
+    for mot, count in compteur_mots.items():
+        if count >= seuil_occurrences:
+            # Créer un label avec majuscule
+            label = mot.capitalize()
+            filtres_auto[f"auto_{mot}"] = {
+                "label": f"{label} ({count})",
+                "termes": [mot],
+                "count": count
+            }
+
+    # Ne garder que les k filtres les plus fréquents, sans trier toute la liste
+    if top_k is not None:
+        return dict(heapq.nlargest(top_k, filtres_auto.items(), key=lambda x: x[1]["count"]))
+
+    # Trier par nombre d'occurrences décroissant
+    filtres_auto = dict(sorted(
+        filtres_auto.items(),
+        key=lambda x: x[1]["count"],
+        reverse=True
+    ))
+
+    return filtres_auto
+
+
+# Filtres organisés par groupe
+# Chaque filtre : code -> {"label": affiché, "termes": [cherchés dans le libellé sans accents]}
+FILTRES_DISPONIBLES = {
+    # ===== CONDITIONNEMENT =====
+    "Format / Conditionnement": {
+        "kg":           {"label": "Vente au kg",    "termes": []},  # basé sur unite_fact = 2
+        "unite":        {"label": "À l'unité",      "termes": []},  # basé sur unite_fact = 1
+        "barquette":    {"label": "Barquette",      "termes": ["barquette", "barquettes", "barq", "barqu"]},
+        "carton":       {"label": "Carton",         "termes": ["carton", "cartons", "cart"]},
+        "seau":         {"label": "Seau",           "termes": ["seau", "seaux"]},
+        "plateau":      {"label": "Plateau",        "termes": ["plateau"]},
+        "vrac":         {"label": "Vrac",           "termes": ["vrac"]},
+        "s/v":          {"label": "Sous vide",      "termes": ["s/vide", "sous vide", "sous-vide"]},
+        "s/at":         {"label": "Sous atmosphère","termes": ["s/at", "sous atmosphere"]},
+        "opercule":     {"label": "Operculé",       "termes": ["opercule", "opercules", "operculee", "operculees"]},
+        "entier":       {"label": "Entier",         "termes": ["entier", "entiers", "entiere", "entieres"]},
+        "quart":        {"label": "Quart",          "termes": ["quart", "quarts"]},
+        "tranchee":     {"label": "Tranchée",       "termes": ["tranchee", "tranchees"]},
+        "ficelle":      {"label": "Ficelle",        "termes": ["ficelle", "ficelles"]},
+    },
+
+    # ===== VIANDES =====
+    "Types de viandes": {
+        "porc":         {"label": "Porc",           "termes": ["porc", "porcs"]},
+        "bovin":        {"label": "Bovin",          "termes": ["boeuf", "boeufs", "veau", "veaux", "bovin", "bovins"]},
+        "poulet":       {"label": "Poulet",         "termes": ["poulet", "poulets"]},
+        "dinde":        {"label": "Dinde",          "termes": ["dinde", "dindes"]},
+        "canard":       {"label": "Canard",         "termes": ["canard", "canards"]},
+        "chapon":       {"label": "Chapon",         "termes": ["chapon", "chapons"]},
+        "pintade":      {"label": "Pintade",        "termes": ["pintade", "pintades"]},
+        "lapin":        {"label": "Lapin",          "termes": ["lapin", "lapins"]},
+        "saumon":       {"label": "Saumon",         "termes": ["saumon", "saumons"]},
+    },
+
+    "Découpes / Morceaux": {
+        "filet":        {"label": "Filet",          "termes": ["filet", "filets"]},
+        "cote":         {"label": "Côte",           "termes": ["cote", "cotes"]},
+        "echine":       {"label": "Échine",         "termes": ["echine", "echines"]},
+        "epaule":       {"label": "Épaule",         "termes": ["epaule", "epaules"]},
+        "cuisse":       {"label": "Cuisse",         "termes": ["cuisse", "cuisses"]},
+        "poitrine":     {"label": "Poitrine",       "termes": ["poitrine", "poitrines"]},
+        "jambon":       {"label": "Jambon",         "termes": ["jambon", "jambons"]},
+        "palette":      {"label": "Palette",        "termes": ["palette", "palettes"]},
+        "jarret":       {"label": "Jarret",         "termes": ["jarret", "jarrets"]},
+        "rouelle":      {"label": "Rouelle",        "termes": ["rouelle", "rouelles"]},
+        "mignon":       {"label": "Mignon",         "termes": ["mignon", "mignons"]},
+        "onglet":       {"label": "Onglet",         "termes": ["onglet", "onglets"]},
+        "araignee":     {"label": "Araignée",       "termes": ["araignee", "araignees"]},
+        "noix":         {"label": "Noix",           "termes": ["noix"]},
+        "blancs":       {"label": "Blancs",         "termes": ["blancs", "blanc"]},
+        "emince":       {"label": "Émincé",         "termes": ["emince", "eminces"]},
+        "palet":        {"label": "Palet",          "termes": ["palet", "palets"]},
+        "joues":        {"label": "Joues",          "termes": ["joue", "joues"]},
+        "foie":         {"label": "Foie",           "termes": ["foie", "foies"]},
+        "queue":        {"label": "Queue",          "termes": ["queue", "queues"]},
+        "tete":         {"label": "Tête",           "termes": ["tete", "tetes"]},
+        "maigre":       {"label": "Maigre",         "termes": ["maigre", "maigres"]},
+        "gras":         {"label": "Gras",           "termes": ["gras"]},
+        "paree":        {"label": "Parée",          "termes": ["paree", "parees", "pare", "pares"]},
+    },
+
+    "Spécifiques porc": {
+        "travers":      {"label": "Travers",        "termes": ["travers"]},
+        "ribs":         {"label": "Ribs",           "termes": ["ribs"]},
+        "paletot":      {"label": "Paletot",        "termes": ["paletot", "paletots"]},
+    },
+
+    # ===== CHARCUTERIE =====
+    "Charcuterie": {
+        "saucisse":     {"label": "Saucisse",       "termes": ["saucisse", "saucisses"]},
+        "chipolata":    {"label": "Chipolata",      "termes": ["chipolata", "chipolatas", "chipo", "chipos"]},
+        "merguez":      {"label": "Merguez",        "termes": ["merguez"]},
+        "boudin":       {"label": "Boudin",         "termes": ["boudin", "boudins"]},
+        "andouillette": {"label": "Andouillette",   "termes": ["andouillette", "andouillettes"]},
+        "chorizo":      {"label": "Chorizo",        "termes": ["chorizo", "chorizos"]},
+        "chorizettes":  {"label": "Chorizettes",    "termes": ["chorizette", "chorizettes"]},
+        "crepinettes":  {"label": "Crépinettes",    "termes": ["crepinette", "crepinettes"]},
+        "francfort":    {"label": "Francfort",      "termes": ["francfort", "francforts"]},
+        "strasbourg":   {"label": "Strasbourg",     "termes": ["strasbourg"]},
+        "cervelas":     {"label": "Cervelas",       "termes": ["cervelas"]},
+        "saucisson":    {"label": "Saucisson",      "termes": ["saucisson", "saucissons"]},
+        "rillettes":    {"label": "Rillettes",      "termes": ["rillettes"]},
+        "rillauds":     {"label": "Rillauds",       "termes": ["rillauds"]},
+        "pate":         {"label": "Pâté",           "termes": ["pate", "pates"]},
+        "terrine":      {"label": "Terrines",       "termes": ["terrine", "terrines"]},
+        "tortillade":   {"label": "Tortillades",    "termes": ["tortillade", "tortillades"]},
+        "langouille":   {"label": "Langouille",     "termes": ["langouille", "langouilles"]},
+        "tripes":       {"label": "Tripes / Boyaux","termes": ["tripes", "boyaux", "rognon", "rognons", "rein", "reins"]},
+    },
+
+    # ===== PREPARATIONS =====
+    "Préparations": {
+        "paupiette":    {"label": "Paupiette",      "termes": ["paupiette", "paupiettes", "paup"]},
+        "brochette":    {"label": "Brochette",      "termes": ["brochette", "brochettes", "broch"]},
+        "grillade":     {"label": "Grillade",       "termes": ["grillade", "grillades"]},
+        "roti":         {"label": "Rôti",           "termes": ["roti", "rotis"]},
+        "saute":        {"label": "Sauté",          "termes": ["saute", "sautes"]},
+        "farce":        {"label": "Farce / Farci",  "termes": ["farce", "farces", "farci", "farcis", "farcie", "farcies"]},
+        "marinade":     {"label": "Marinade",       "termes": ["marinade", "marinades", "marine", "marines"]},
+        "confites":     {"label": "Confit",         "termes": ["confite", "confites", "confit", "confits"]},
+        "saumure":      {"label": "Saumure",        "termes": ["saumure", "saumures", "saumuree", "saumurees"]},
+        "brasse":       {"label": "Brassé / Braisé","termes": ["brasse", "brasses", "braisee", "braisees"]},
+        "precuit":      {"label": "Précuit",        "termes": ["precuit", "precuits", "pre-cuit"]},
+        "barbecue":     {"label": "Barbecue",       "termes": ["barbecue", "barbecues", "bbq"]},
+        "wok":          {"label": "Wok",            "termes": ["wok", "woks"]},
+        "tartinable":   {"label": "Tartinable",     "termes": ["tartinable", "tartinables"]},
+        "assort":       {"label": "Assortiment",    "termes": ["assort", "assortiment", "assortiments"]},
+        "cassolettes":  {"label": "Cassolettes",    "termes": ["cassolette", "cassolettes"]},
+        "gourdinade":   {"label": "Gourdinade",     "termes": ["gourdinade", "gourdinades"]},
+        "delice":       {"label": "Délice",         "termes": ["delice", "delices"]},
+        "tapas":        {"label": "Tapas",          "termes": ["tapas"]},
+        "festif":       {"label": "Festif",         "termes": ["festif", "festifs", "festive", "festives"]},
+    },
+
+    "Recettes régionales": {
+        "vendeenne":    {"label": "Vendéenne",      "termes": ["vendeenne", "vendeennes", "vendeen", "vendeens", "vendee", "ven"]},
+        "toulouse":     {"label": "Toulouse",       "termes": ["toulouse"]},
+        "provencale":   {"label": "Provençale",     "termes": ["provencale", "provencales", "provencal"]},
+        "basquaise":    {"label": "Basquaise",      "termes": ["basquaise", "basquaises"]},
+        "savoyard":     {"label": "Savoyard",       "termes": ["savoyard", "savoyards", "savoyarde", "savoyardes"]},
+        "montagnard":   {"label": "Montagnard",     "termes": ["montagnard", "montagnards", "montagnarde", "montagnardes"]},
+        "tartiflette":  {"label": "Tartiflette",    "termes": ["tartiflette", "tartiflettes"]},
+        "choucroute":   {"label": "Choucroute",     "termes": ["choucroute", "choucroutes"]},
+        "obernois":     {"label": "Obernois",       "termes": ["obernois", "obernoise", "obernoises"]},
+        "potee":        {"label": "Potée",          "termes": ["potee", "potees"]},
+        "campagne":     {"label": "Campagne",       "termes": ["campagne", "campagnes"]},
+        "paysanne":     {"label": "Paysanne",       "termes": ["paysanne", "paysannes"]},
+        "grand_mere":   {"label": "Grand-mère",     "termes": ["grand mere", "grand-mere", "grandmere"]},
+        "vigneronne":   {"label": "Vigneronne",     "termes": ["vigneronne", "vigneronnes"]},
+        "orloff":       {"label": "Orloff",         "termes": ["orloff"]},
+        "brasero":      {"label": "Brasero",        "termes": ["brasero", "braseros"]},
+        "maitre_hotel": {"label": "Maître d'hôtel", "termes": ["maitre", "hotel"]},
+        "tomates_farcies": {"label": "Tomates farcies", "termes": ["tomates farcies", "tomate farcie"]},
+        "surprise_paprika": {"label": "Surprise paprika", "termes": ["surprise paprika"]},
+    },
+
+    "Recettes du monde": {
+        "mexicaines":   {"label": "Mexicaines",     "termes": ["mexicaine", "mexicaines", "mexicain", "mexicains", "mex", "tex"]},
+        "antillais":    {"label": "Antillais",      "termes": ["antillais", "antillaise", "antillaises"]},
+        "andalou":      {"label": "Andalou",        "termes": ["andalou", "andalous", "andalouse", "andalouses"]},
+        "italienne":    {"label": "Italienne",      "termes": ["italienne", "italiennes", "italien", "italiens"]},
+        "indienne":     {"label": "Indienne",       "termes": ["indienne", "indiennes", "indien", "indiens"]},
+        "tandoori":     {"label": "Tandoori",       "termes": ["tandoori", "tandooris"]},
+        "massala":      {"label": "Massala",        "termes": ["massala", "masala"]},
+        "norvegien":    {"label": "Norvégien",      "termes": ["norvegien", "norvegiens", "norvegienne", "norvegiennes"]},
+    },
+
+    # ===== CONSERVATION =====
+    "Conservation": {
+        "frais":        {"label": "Frais",          "termes": ["frais"]},
+        "surgele":      {"label": "Surgelé",        "termes": ["surgele", "surgeles", "congele", "congeles"]},
+        "crues":        {"label": "Crues",          "termes": ["crues", "crue"]},
+        "cuit":         {"label": "Cuit",           "termes": ["cuit", "cuits", "cuite", "cuites"]},
+        "sale":         {"label": "Salé",           "termes": ["sale", "sales", "salee", "salees"]},
+        "fume":         {"label": "Fumé",           "termes": ["fume", "fumes", "fumee", "fumees"]},
+    },
+
+    # ===== QUALITÉ =====
+    "Labels / Qualité": {
+        "fermiere":     {"label": "Viande fermière","termes": ["fermiere", "fermieres", "fermier", "fermiers"]},
+        "label_rouge":  {"label": "Label Rouge",    "termes": ["label rouge"]},
+        "bbc":          {"label": "Bleu Blanc Coeur","termes": ["bleu blanc coeur", "bbc"]},
+        "vpf":          {"label": "VPF (Porc Français)", "termes": ["vpf"]},
+        "vbf":          {"label": "VBF (Bovin Français)", "termes": ["vbf"]},
+    },
+
+    # ===== FROMAGES =====
+    "Fromages": {
+        "comte":        {"label": "Comté",          "termes": ["comte", "comtes"]},
+        "emmental":     {"label": "Emmental",       "termes": ["emmental", "emmentals"]},
+        "reblochon":    {"label": "Reblochon",      "termes": ["reblochon", "reblochons"]},
+        "chevre":       {"label": "Chèvre",         "termes": ["chevre", "chevres"]},
+        "camenbert":    {"label": "Camembert",      "termes": ["camenbert", "camenberts", "camembert", "camemberts"]},
+        "bleu":         {"label": "Bleu",           "termes": ["bleu d'auvergne", "bleu de bresse", "bleu de gex", "fourme", "fourmes"]},
+    },
+
+    # ===== SAVEURS =====
+    "Épices / Aromates": {
+        "piment":       {"label": "Pimenté",        "termes": ["piment", "piments", "pimente", "pimentes"]},
+        "paprika":      {"label": "Paprika",        "termes": ["paprika"]},
+        "espelette":    {"label": "Espelette",      "termes": ["espelette", "espel"]},
+        "poivres":      {"label": "Poivres",        "termes": ["poivre", "poivres"]},
+        "thym":         {"label": "Thym",           "termes": ["thym", "thyms"]},
+        "herbes":       {"label": "Aux herbes",     "termes": ["herbe", "herbes"]},
+        "ail":          {"label": "Ail",            "termes": ["ail", "ails"]},
+        "persillade":   {"label": "Persillade",     "termes": ["persillade", "persillades"]},
+        "persillee":    {"label": "Persillée",      "termes": ["persillee", "persillees", "persille", "persilles"]},
+    },
+
+    "Garnitures / Accompagnements": {
+        "oignons":      {"label": "Oignons",        "termes": ["oignon", "oignons"]},
+        "echalote":     {"label": "Échalote",       "termes": ["echalote", "echalotes"]},
+        "tomates":      {"label": "Tomates",        "termes": ["tomate", "tomates"]},
+        "legumes":      {"label": "Légumes",        "termes": ["legume", "legumes"]},
+        "mogette":      {"label": "Mogette",        "termes": ["mogette", "mogettes"]},
+        "coco":         {"label": "Coco",           "termes": ["coco", "cocos"]},
+        "pruneaux":     {"label": "Pruneaux",       "termes": ["pruneaux", "pruneau"]},
+        "abricots":     {"label": "Abricots",       "termes": ["abricots", "abricot"]},
+        "marrons":      {"label": "Marrons",        "termes": ["marron", "marrons"]},
+        "raisins":      {"label": "Raisins",        "termes": ["raisin", "raisins"]},
+        "citron":       {"label": "Citron",         "termes": ["citron", "citrons"]},
+        "orange":       {"label": "Orange",         "termes": ["orange", "oranges"]},
+        "melon":        {"label": "Melon",          "termes": ["melon"]},
+        "muscadet":     {"label": "Muscadet",       "termes": ["muscadet", "muscadets"]},
+        "biere":        {"label": "Bière",          "termes": ["biere", "bieres"]},
+        "miel":         {"label": "Miel",           "termes": ["miel", "miels"]},
+    },
+
+    "Styles": {
+        "nature":       {"label": "Nature",         "termes": ["nature", "natures", "nat"]},
+        "naturel":      {"label": "Naturel",        "termes": ["naturel", "naturels", "naturelle", "naturelles"]},
+        "trad":         {"label": "Traditionnelle", "termes": ["trad", "traditionnelle", "traditionnelles", "traditionnel", "traditionnels"]},
+        "fine":         {"label": "Fine",           "termes": ["fine", "fines"]},
+    },
+
+    # ===== AUTRES =====
+    "Autres": {
+        "foie_gras":    {"label": "Foie gras",      "termes": ["foie gras"]},
+        "magret":       {"label": "Magret",         "termes": ["magret", "magrets"]},
+    },
+}
+
+
+# Filtres manuels à plat (groupe, code, libellé), dans l'ordre d'affichage
+FILTRES_FLAT = tuple(
+    (groupe, code, info["label"])
+    for groupe, filtres in FILTRES_DISPONIBLES.items()
+    for code, info in filtres.items()
+)
+
+
+# Mots exclus des filtres automatiques : mots ignorés + termes des filtres manuels
+_EXCLUSIONS = MOTS_IGNORES | _get_termes_manuels()
+
+
+# Termes des filtres manuels pré-encodés en octets, calculés une seule fois.
+# Les termes sont en ASCII : la recherche se fait sur des bytes (libellé encodé en ASCII),
+# les doublons sont retirés et les termes les plus courts testés en premier.
+_FILTRES_FLAT_B = tuple(
+    (code, tuple(t.encode('ascii') for t in sorted(dict.fromkeys(info["termes"]), key=len)))
+    for groupe in FILTRES_DISPONIBLES.values()
+    for code, info in groupe.items()
+    if info["termes"]
+)
+
+# Position de chaque code dans FILTRES_DISPONIBLES, pour rendre les tags dans l'ordre des filtres
+_RANG_CODES = {code: rang for rang, (code, _) in enumerate(_FILTRES_FLAT_B)}
+
+
+# Index terme -> codes : un terme trouvé dans le libellé implique aussi tous
+# les termes qu'il contient (ex. "foie gras" contient "foie" et "gras").
+_TERME_VERS_CODES = {
+    terme: tuple(
+        code for code, termes in _FILTRES_FLAT_B
+        if any(t in terme for t in termes)
+    )
+    for terme in {t for _, termes in _FILTRES_FLAT_B for t in termes}
+}
+
+# Une seule expression régulière pour tous les termes (les plus longs d'abord).
+# Le lookahead permet de trouver les correspondances qui se chevauchent.
+_TERMES_RE = re.compile(
+    b'(?=(' + b'|'.join(
+        re.escape(t) for t in sorted(_TERME_VERS_CODES, key=len, reverse=True)
+    ) + b'))'
+)
+
+
+@lru_cache(maxsize=8192)
+def _tags_manuels(libelle):
+    """
+    Calcule les codes de filtres manuels correspondant à un libellé.
+
+    Le résultat est figé (tuple) et mis en cache : un même libellé présent
+    dans plusieurs catalogues clients n'est analysé qu'une seule fois.
+    """
+    nom_bytes = _normaliser(libelle).encode('ascii', 'ignore')
+    codes = set()
+    for terme in _TERMES_RE.findall(nom_bytes):
+        codes.update(_TERME_VERS_CODES[terme])
+    return tuple(sorted(codes, key=_RANG_CODES.__getitem__))
+
+
+def _get_cache_key(produits):
+    """Génère une clé de cache basée sur les références produits."""
+    refs = sorted([p.get('reference', p.get('prod', '')) for p in produits])
+    return f"filtres_{hash(tuple(refs))}"
+
+
+@lru_cache(maxsize=32)
+def _index_termes_auto(termes_auto):
+    """
+    Construit l'expression régulière unique des termes des filtres automatiques.
+
+    Même principe que les filtres manuels (_TERMES_RE) :
+    une seule passe sur le libellé au lieu d'une recherche par terme.
+    Le résultat est mis en cache par jeu de filtres : les filtres
+    automatiques relus depuis le cache ne recompilent pas l'expression.
+
+    Args:
+        termes_auto (tuple): Couples (code, termes) des filtres automatiques
+
+    Returns:
+        tuple: (expression compilée, index terme -> codes, rang de chaque code)
+    """
+    termes_auto = [
+        (code, [terme.encode('ascii') for terme in termes])
+        for code, termes in termes_auto
+    ]
+    # Un terme trouvé implique aussi les termes qu'il contient
+    terme_vers_codes = {
+        terme: tuple(code for code, termes in termes_auto if any(t in terme for t in termes))
+        for terme in {t for _, termes in termes_auto for t in termes}
+    }
+    regex = re.compile(
+        b'(?=(' + b'|'.join(
+            re.escape(t) for t in sorted(terme_vers_codes, key=len, reverse=True)
+        ) + b'))'
+    )
+    rang_codes = {code: rang for rang, (code, _) in enumerate(termes_auto)}
+    return regex, terme_vers_codes, rang_codes
+
+
+def _ajouter_tags_auto(produits, filtres_auto):
+    """
+    Ajoute aux produits les tags des filtres automatiques présents dans leur libellé.
+
+    Tous les termes sont recherchés en une seule passe sur le libellé
+    normalisé (encodé en ASCII) ; les tags sont ajoutés dans l'ordre
+    des filtres automatiques.
+
+    La liste de tags d'un produit est remplacée (jamais complétée sur place) :
+    une copie superficielle d'un produit partagé peut être passée sans
+    modifier l'original.
+    """
+    if not filtres_auto:
+        return
+    regex, terme_vers_codes, rang_codes = _index_termes_auto(tuple(
+        (code, tuple(info["termes"])) for code, info in filtres_auto.items()
+    ))
+    for produit in produits:
+        libelle_bytes = _normaliser(produit.get('libelle', '') or '').encode('ascii', 'ignore')
+        codes = set()
+        for terme in regex.findall(libelle_bytes):
+            codes.update(terme_vers_codes[terme])
+        if not codes:
+            continue
+        tags = produit.get('tags', [])
+        codes.difference_update(tags)
+        if codes:
+            produit['tags'] = tags + sorted(codes, key=rang_codes.__getitem__)
+
+
+def preparer_filtres(produits, seuil_occurrences=3, use_cache=True):
+    """
+    Prépare les filtres disponibles pour une liste de produits.
+
+    Cette fonction analyse les produits et génère deux types de filtres :
+    1. Filtres prédéfinis (définis dans FILTRES_DISPONIBLES)
+    2. Filtres automatiques (générés à partir des libellés des produits)
+
+    Les filtres qui ne correspondent à aucun ou à tous les produits
+    sont automatiquement exclus (inutiles pour le filtrage).
+
+    Args:
+        produits (list): Liste de dictionnaires représentant les produits.
+                        Chaque produit doit avoir au minimum 'libelle' et 'tags'.
+        seuil_occurrences (int): Nombre minimum de produits devant correspondre
+                                 à un filtre automatique pour qu'il soit affiché.
+                                 Défaut: 3
+        use_cache (bool): Utiliser le cache pour les filtres. Défaut: True
+
+    Returns:
+        tuple: Un triplet contenant :
+            - produits (list): Les produits avec leurs tags mis à jour
+            - filtres_groupes (dict): Filtres groupés par catégorie pour l'affichage
+            - tags_disponibles (set): Ensemble des codes de tags utilisables
+    """
+    # Vérifier le cache
+    cache_key = _get_cache_key(produits) if use_cache else None
+    if use_cache:
+        cached_data = cache.get(cache_key)
+        if cached_data:
+            filtres_groupes, tags_disponibles, filtres_auto = cached_data
+            # Réappliquer les tags aux produits
+            _ajouter_tags_auto(produits, filtres_auto)
+            return produits, filtres_groupes, tags_disponibles
+
+    # Générer les filtres automatiques à partir des libellés des produits
+    # Ces filtres sont créés dynamiquement en analysant les mots-clés récurrents
+    filtres_auto = generer_filtres_automatiques(produits, seuil_occurrences=seuil_occurrences)
+
+    # Ajouter les tags automatiques aux produits
+    _ajouter_tags_auto(produits, filtres_auto)
+
+    # Compter les occurrences de chaque tag dans la liste des produits
+    tags_count = {}
+    for p in produits:
+        for tag in p.get('tags', []):
+            tags_count[tag] = tags_count.get(tag, 0) + 1
+
+    # Ne garder que les tags utiles pour le filtrage :
+    # - Plus d'1 produit (sinon trop restrictif)
+    # - Moins que le total (sinon filtre inutile car tous les produits correspondent)
+    total_produits = len(produits)
+    tags_disponibles = {tag for tag, count in tags_count.items() if 1 < count < total_produits}
+
+    # Construire les filtres groupés pour l'affichage dans le template
+    # Un groupe n'est créé que s'il contient au moins un filtre avec des produits
+    filtres_groupes = {}
+    for groupe, code, label in FILTRES_FLAT:
+        if code in tags_disponibles:
+            filtres_groupes.setdefault(groupe, {})[code] = label
+
+    # Ajouter les filtres automatiques comme groupe séparé "Filtres personnalisés"
+    if filtres_auto:
+        # Appliquer le même filtre : plus d'1 produit ET moins que le total
+        filtres_auto_valides = {
+            code: info["label"]
+            for code, info in filtres_auto.items()
+            if 1 < tags_count.get(code, 0) < total_produits
+        }
+        if filtres_auto_valides:
+            filtres_groupes["Filtres personnalisés"] = filtres_auto_valides
+
+    # Mettre en cache les résultats (5 minutes)
+    if use_cache and cache_key:
+        cache.set(cache_key, (filtres_groupes, tags_disponibles, filtres_auto), 300)
+
+    return produits, filtres_groupes, tags_disponibles
+
+
+def construire_index_tags(produits):
+    """
+    Construit l'index inversé {tag: références des produits portant ce tag}.
+
+    Calculé une fois pour une liste de produits (par exemple avec le
+    catalogue en cache), il permet à appliquer_filtres de résoudre les
+    filtres actifs par union d'ensembles plutôt qu'en relisant les tags de
+    chaque produit.
+
+    Args:
+        produits (list): Liste des produits avec leurs 'tags'
+
+    Returns:
+        dict: {code_tag: frozenset(références)}
+    """
+    index = {}
+    for p in produits:
+        reference = p.get('reference', p.get('prod', ''))
+        for tag in p.get('tags', []):
+            index.setdefault(tag, set()).add(reference)
+    return {tag: frozenset(refs) for tag, refs in index.items()}
@@ -1,343 +1,209 @@
 """
 Service pour récupérer les produits et prix depuis la base MariaDB distante.
 """
-import unicodedata
-import re
-from collections import Counter
+from types import SimpleNamespace
 
+from django.core.cache import cache
 from django.db import connections
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.db.models.functions import Trim
 
+from .filtres import _tags_manuels, construire_index_tags, preparer_filtres
 from .models import ComCli, ComCliLig, Catalogue, Prod
+from commandes.models import LigneCommande
 
 
-def _normaliser(texte):
-    """Retire les accents et met en minuscule pour la comparaison."""
-    return unicodedata.normalize('NFD', texte).encode('ascii', 'ignore').decode('ascii').lower()
+# Colonnes de comcli utilisées pour l'affichage et l'EDI
+CHAMPS_CLIENT_DISTANT = ('tiers', 'nom', 'complement', 'adresse', 'cp', 'acheminement')
 
+# Durée de conservation des informations client distantes (secondes)
+CACHE_TIMEOUT_CLIENT = 900
 
-# Mots à ignorer pour les filtres automatiques
-MOTS_IGNORES = {
-    # Articles et prépositions
-    'de', 'du', 'des', 'le', 'la', 'les', 'un', 'une', 'au', 'aux', 'en', 'et', 'ou', 'a', 'par',
-    'pour', 'avec', 'sans', 'sur', 'sous', 'dans', 'entre',
-    # Unités et mesures
-    'kg', 'gr', 'g', 'ml', 'cl', 'l', 'pce', 'pcs', 'env', 'environ', 'mini', 'maxi', 'max', 'min',
-    # Nombres
-    '0', '1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '12', '15', '20', '25', '30', '50', '100',
-    # Mots trop génériques
-    'viande', 'piece', 'pieces', 'tranche', 'tranches', 'lot', 'x', 'n', 'type', 'vide', 'col',
-    'demi', 'sup', 'sel', 'sat', 'mensec', 'noir', 'sauc', 'unite', 'vrac', 'colis', 'l', 'lunite','dlc','courte','fine',
-    'psh','skin','petit','pret','cuire',
-    # Mots trop courts ou génériques
-    'court', 'eco', 'cuisine', 'tranch', 'cais', 'grand', 'mere',
-    # Mots associés à bière (brune/blonde)
-    'brune', 'brunes', 'blonde', 'blondes',
-}
+# Valeur sentinelle pour distinguer « absent du cache » de « client inconnu »
+_ABSENT = object()
 
 
-def _get_termes_manuels():
-    """Récupère tous les termes déjà couverts par les filtres manuels."""
-    termes = set()
-    for groupe in FILTRES_DISPONIBLES.values():
-        for info in groupe.values():
-            termes.update(info.get("termes", []))
-    return termes
+def _cle_cache_client(code_tiers):
+    """Clé de cache des informations distantes d'un client."""
+    return f"client_distant:{code_tiers}:v2"
 
 
-def generer_filtres_automatiques(produits, seuil_occurrences=3):
+def _adresses_clients(codes_tiers):
     """
-    Génère des filtres automatiques à partir des libellés des produits.
-    Exclut les termes déjà couverts par les filtres manuels (approche hybride).
+    Adresses comcli des clients donnés, dans l'ordre de préférence.
+
+    Pour chaque client : les entrées sans complément (adresse principale)
+    d'abord, triées par nom ; puis les autres par complément et nom.
+    Seules les colonnes CHAMPS_CLIENT_DISTANT sont lues.
 
     Args:
-        produits: Liste des produits avec leurs libellés
-        seuil_occurrences: Nombre minimum d'occurrences pour créer un filtre
+        codes_tiers (list): Codes tiers des clients
 
     Returns:
-        Dictionnaire {code: {"label": label, "termes": [termes]}}
-    """
-    # Récupérer les termes déjà couverts par les filtres manuels
-    termes_manuels = _get_termes_manuels()
-
-    # Compter tous les mots significatifs
-    compteur_mots = Counter()
-
-    for produit in produits:
-        libelle = produit.get('libelle', '') or ''
-        # Normaliser et extraire les mots
-        libelle_normalise = _normaliser(libelle)
-        # Garder uniquement les mots de 3+ caractères
-        mots = re.findall(r'\b[a-z]{3,}\b', libelle_normalise)
-
-        # Ne compter chaque mot qu'une fois par produit
-        mots_uniques = set(mots)
-        for mot in mots_uniques:
-            # Exclure les mots ignorés ET les termes déjà dans les filtres manuels
-            if mot not in MOTS_IGNORES and mot not in termes_manuels:
-                compteur_mots[mot] += 1
-
-    # Créer les filtres pour les mots fréquents
-    filtres_auto = {}
-    for mot, count in compteur_mots.items():
-        if count >= seuil_occurrences:
-            # Créer un label avec majuscule
-            label = mot.capitalize()
-            filtres_auto[f"auto_{mot}"] = {
-                "label": f"{label} ({count})",
-                "termes": [mot],
-                "count": count
-            }
-
-    # Trier par nombre d'occurrences décroissant
-    filtres_auto = dict(sorted(
-        filtres_auto.items(),
-        key=lambda x: x[1]["count"],
-        reverse=True
-    ))
-
-    return filtres_auto
-
-
-# Filtres organisés par groupe
-# Chaque filtre : code -> {"label": affiché, "termes": [cherchés dans le libellé sans accents]}
-FILTRES_DISPONIBLES = {
-    # ===== CONDITIONNEMENT =====
-    "Format / Conditionnement": {
-        "kg":           {"label": "Vente au kg",    "termes": []},  # basé sur unite_fact = 2
-        "unite":        {"label": "À l'unité",      "termes": []},  # basé sur unite_fact = 1
-        "barquette":    {"label": "Barquette",      "termes": ["barquette", "barquettes", "barq", "barqu"]},
-        "carton":       {"label": "Carton",         "termes": ["carton", "cartons", "cart"]},
-        "seau":         {"label": "Seau",           "termes": ["seau", "seaux"]},
-        "plateau":      {"label": "Plateau",        "termes": ["plateau"]},
-        "vrac":         {"label": "Vrac",           "termes": ["vrac"]},
-        "s/v":          {"label": "Sous vide",      "termes": ["s/vide", "sous vide", "sous-vide"]},
-        "s/at":         {"label": "Sous atmosphère","termes": ["s/at", "sous atmosphere"]},
-        "opercule":     {"label": "Operculé",       "termes": ["opercule", "opercules", "operculee", "operculees"]},
-        "entier":       {"label": "Entier",         "termes": ["entier", "entiers", "entiere", "entieres"]},
-        "quart":        {"label": "Quart",          "termes": ["quart", "quarts"]},
-        "tranchee":     {"label": "Tranchée",       "termes": ["tranchee", "tranchees"]},
-        "ficelle":      {"label": "Ficelle",        "termes": ["ficelle", "ficelles"]},
-    },
-
-    # ===== VIANDES =====
-    "Types de viandes": {
-        "porc":         {"label": "Porc",           "termes": ["porc", "porcs"]},
-        "bovin":        {"label": "Bovin",          "termes": ["boeuf", "boeufs", "veau", "veaux", "bovin", "bovins"]},
-        "poulet":       {"label": "Poulet",         "termes": ["poulet", "poulets"]},
-        "dinde":        {"label": "Dinde",          "termes": ["dinde", "dindes"]},
-        "canard":       {"label": "Canard",         "termes": ["canard", "canards"]},
-        "chapon":       {"label": "Chapon",         "termes": ["chapon", "chapons"]},
-        "pintade":      {"label": "Pintade",        "termes": ["pintade", "pintades"]},
-        "lapin":        {"label": "Lapin",          "termes": ["lapin", "lapins"]},
-        "saumon":       {"label": "Saumon",         "termes": ["saumon", "saumons"]},
-    },
-
-    "Découpes / Morceaux": {
-        "filet":        {"label": "Filet",          "termes": ["filet", "filets"]},
-        "cote":         {"label": "Côte",           "termes": ["cote", "cotes"]},
-        "echine":       {"label": "Échine",         "termes": ["echine", "echines"]},
-        "epaule":       {"label": "Épaule",         "termes": ["epaule", "epaules"]},
-        "cuisse":       {"label": "Cuisse",         "termes": ["cuisse", "cuisses"]},
-        "poitrine":     {"label": "Poitrine",       "termes": ["poitrine", "poitrines"]},
-        "jambon":       {"label": "Jambon",         "termes": ["jambon", "jambons"]},
-        "palette":      {"label": "Palette",        "termes": ["palette", "palettes"]},
-        "jarret":       {"label": "Jarret",         "termes": ["jarret", "jarrets"]},
-        "rouelle":      {"label": "Rouelle",        "termes": ["rouelle", "rouelles"]},
-        "mignon":       {"label": "Mignon",         "termes": ["mignon", "mignons"]},
-        "onglet":       {"label": "Onglet",         "termes": ["onglet", "onglets"]},
-        "araignee":     {"label": "Araignée",       "termes": ["araignee", "araignees"]},
-        "noix":         {"label": "Noix",           "termes": ["noix"]},
-        "blancs":       {"label": "Blancs",         "termes": ["blancs", "blanc"]},
-        "emince":       {"label": "Émincé",         "termes": ["emince", "eminces"]},
-        "palet":        {"label": "Palet",          "termes": ["palet", "palets"]},
-        "joues":        {"label": "Joues",          "termes": ["joue", "joues"]},
-        "foie":         {"label": "Foie",           "termes": ["foie", "foies"]},
-        "queue":        {"label": "Queue",          "termes": ["queue", "queues"]},
-        "tete":         {"label": "Tête",           "termes": ["tete", "tetes"]},
-        "maigre":       {"label": "Maigre",         "termes": ["maigre", "maigres"]},
-        "gras":         {"label": "Gras",           "termes": ["gras"]},
-        "paree":        {"label": "Parée",          "termes": ["paree", "parees", "pare", "pares"]},
-    },
-
-    "Spécifiques porc": {
-        "travers":      {"label": "Travers",        "termes": ["travers"]},
-        "ribs":         {"label": "Ribs",           "termes": ["ribs"]},
-        "paletot":      {"label": "Paletot",        "termes": ["paletot", "paletots"]},
-    },
-
-    # ===== CHARCUTERIE =====
-    "Charcuterie": {
-        "saucisse":     {"label": "Saucisse",       "termes": ["saucisse", "saucisses"]},
-        "chipolata":    {"label": "Chipolata",      "termes": ["chipolata", "chipolatas", "chipo", "chipos"]},
-        "merguez":      {"label": "Merguez",        "termes": ["merguez"]},
-        "boudin":       {"label": "Boudin",         "termes": ["boudin", "boudins"]},
-        "andouillette": {"label": "Andouillette",   "termes": ["andouillette", "andouillettes"]},
-        "chorizo":      {"label": "Chorizo",        "termes": ["chorizo", "chorizos"]},
-        "chorizettes":  {"label": "Chorizettes",    "termes": ["chorizette", "chorizettes"]},
-        "crepinettes":  {"label": "Crépinettes",    "termes": ["crepinette", "crepinettes"]},
-        "francfort":    {"label": "Francfort",      "termes": ["francfort", "francforts"]},
-        "strasbourg":   {"label": "Strasbourg",     "termes": ["strasbourg"]},
-        "cervelas":     {"label": "Cervelas",       "termes": ["cervelas"]},
-        "saucisson":    {"label": "Saucisson",      "termes": ["saucisson", "saucissons"]},
-        "rillettes":    {"label": "Rillettes",      "termes": ["rillettes"]},
-        "rillauds":     {"label": "Rillauds",       "termes": ["rillauds"]},
-        "pate":         {"label": "Pâté",           "termes": ["pate", "pates"]},
-        "terrine":      {"label": "Terrines",       "termes": ["terrine", "terrines"]},
-        "tortillade":   {"label": "Tortillades",    "termes": ["tortillade", "tortillades"]},
-        "langouille":   {"label": "Langouille",     "termes": ["langouille", "langouilles"]},
-        "tripes":       {"label": "Tripes / Boyaux","termes": ["tripes", "boyaux", "rognon", "rognons", "rein", "reins"]},
-    },
-
-    # ===== PREPARATIONS =====
-    "Préparations": {
-        "paupiette":    {"label": "Paupiette",      "termes": ["paupiette", "paupiettes", "paup"]},
-        "brochette":    {"label": "Brochette",      "termes": ["brochette", "brochettes", "broch"]},
-        "grillade":     {"label": "Grillade",       "termes": ["grillade", "grillades"]},
-        "roti":         {"label": "Rôti",           "termes": ["roti", "rotis"]},
-        "saute":        {"label": "Sauté",          "termes": ["saute", "sautes"]},
-        "farce":        {"label": "Farce / Farci",  "termes": ["farce", "farces", "farci", "farcis", "farcie", "farcies"]},
-        "marinade":     {"label": "Marinade",       "termes": ["marinade", "marinades", "marine", "marines"]},
-        "confites":     {"label": "Confit",         "termes": ["confite", "confites", "confit", "confits"]},
-        "saumure":      {"label": "Saumure",        "termes": ["saumure", "saumures", "saumuree", "saumurees"]},
-        "brasse":       {"label": "Brassé / Braisé","termes": ["brasse", "brasses", "braisee", "braisees"]},
-        "precuit":      {"label": "Précuit",        "termes": ["precuit", "precuits", "pre-cuit"]},
-        "barbecue":     {"label": "Barbecue",       "termes": ["barbecue", "barbecues", "bbq"]},
-        "wok":          {"label": "Wok",            "termes": ["wok", "woks"]},
-        "tartinable":   {"label": "Tartinable",     "termes": ["tartinable", "tartinables"]},
-        "assort":       {"label": "Assortiment",    "termes": ["assort", "assortiment", "assortiments"]},
-        "cassolettes":  {"label": "Cassolettes",    "termes": ["cassolette", "cassolettes"]},
-        "gourdinade":   {"label": "Gourdinade",     "termes": ["gourdinade", "gourdinades"]},
-        "delice":       {"label": "Délice",         "termes": ["delice", "delices"]},
-        "tapas":        {"label": "Tapas",          "termes": ["tapas"]},
-        "festif":       {"label": "Festif",         "termes": ["festif", "festifs", "festive", "festives"]},
-    },
-
-    "Recettes régionales": {
-        "vendeenne":    {"label": "Vendéenne",      "termes": ["vendeenne", "vendeennes", "vendeen", "vendeens", "vendee", "ven"]},
-        "toulouse":     {"label": "Toulouse",       "termes": ["toulouse"]},
-        "provencale":   {"label": "Provençale",     "termes": ["provencale", "provencales", "provencal"]},
-        "basquaise":    {"label": "Basquaise",      "termes": ["basquaise", "basquaises"]},
-        "savoyard":     {"label": "Savoyard",       "termes": ["savoyard", "savoyards", "savoyarde", "savoyardes"]},
-        "montagnard":   {"label": "Montagnard",     "termes": ["montagnard", "montagnards", "montagnarde", "montagnardes"]},
-        "tartiflette":  {"label": "Tartiflette",    "termes": ["tartiflette", "tartiflettes"]},
-        "choucroute":   {"label": "Choucroute",     "termes": ["choucroute", "choucroutes"]},
-        "obernois":     {"label": "Obernois",       "termes": ["obernois", "obernoise", "obernoises"]},
-        "potee":        {"label": "Potée",          "termes": ["potee", "potees"]},
-        "campagne":     {"label": "Campagne",       "termes": ["campagne", "campagnes"]},
-        "paysanne":     {"label": "Paysanne",       "termes": ["paysanne", "paysannes"]},
-        "grand_mere":   {"label": "Grand-mère",     "termes": ["grand mere", "grand-mere", "grandmere"]},
-        "vigneronne":   {"label": "Vigneronne",     "termes": ["vigneronne", "vigneronnes"]},
-        "orloff":       {"label": "Orloff",         "termes": ["orloff"]},
-        "brasero":      {"label": "Brasero",        "termes": ["brasero", "braseros"]},
-        "maitre_hotel": {"label": "Maître d'hôtel", "termes": ["maitre", "hotel"]},
-        "tomates_farcies": {"label": "Tomates farcies", "termes": ["tomates farcies", "tomate farcie"]},
-        "surprise_paprika": {"label": "Surprise paprika", "termes": ["surprise paprika"]},
-    },
-
-    "Recettes du monde": {
-        "mexicaines":   {"label": "Mexicaines",     "termes": ["mexicaine", "mexicaines", "mexicain", "mexicains", "mex", "tex"]},
-        "antillais":    {"label": "Antillais",      "termes": ["antillais", "antillaise", "antillaises"]},
-        "andalou":      {"label": "Andalou",        "termes": ["andalou", "andalous", "andalouse", "andalouses"]},
-        "italienne":    {"label": "Italienne",      "termes": ["italienne", "italiennes", "italien", "italiens"]},
-        "indienne":     {"label": "Indienne",       "termes": ["indienne", "indiennes", "indien", "indiens"]},
-        "tandoori":     {"label": "Tandoori",       "termes": ["tandoori", "tandooris"]},
-        "massala":      {"label": "Massala",        "termes": ["massala", "masala"]},
-        "norvegien":    {"label": "Norvégien",      "termes": ["norvegien", "norvegiens", "norvegienne", "norvegiennes"]},
-    },
-
-    # ===== CONSERVATION =====
-    "Conservation": {
-        "frais":        {"label": "Frais",          "termes": ["frais"]},
-        "surgele":      {"label": "Surgelé",        "termes": ["surgele", "surgeles", "congele", "congeles"]},
-        "crues":        {"label": "Crues",          "termes": ["crues", "crue"]},
-        "cuit":         {"label": "Cuit",           "termes": ["cuit", "cuits", "cuite", "cuites"]},
-        "sale":         {"label": "Salé",           "termes": ["sale", "sales", "salee", "salees"]},
-        "fume":         {"label": "Fumé",           "termes": ["fume", "fumes", "fumee", "fumees"]},
-    },
-
-    # ===== QUALITÉ =====
-    "Labels / Qualité": {
-        "fermiere":     {"label": "Viande fermière","termes": ["fermiere", "fermieres", "fermier", "fermiers"]},
-        "label_rouge":  {"label": "Label Rouge",    "termes": ["label rouge"]},
-        "bbc":          {"label": "Bleu Blanc Coeur","termes": ["bleu blanc coeur", "bbc"]},
-        "vpf":          {"label": "VPF (Porc Français)", "termes": ["vpf"]},
-        "vbf":          {"label": "VBF (Bovin Français)", "termes": ["vbf"]},
-    },
-
-    # ===== FROMAGES =====
-    "Fromages": {
-        "comte":        {"label": "Comté",          "termes": ["comte", "comtes"]},
-        "emmental":     {"label": "Emmental",       "termes": ["emmental", "emmentals"]},
-        "reblochon":    {"label": "Reblochon",      "termes": ["reblochon", "reblochons"]},
-        "chevre":       {"label": "Chèvre",         "termes": ["chevre", "chevres"]},
-        "camenbert":    {"label": "Camembert",      "termes": ["camenbert", "camenberts", "camembert", "camemberts"]},
-        "bleu":         {"label": "Bleu",           "termes": ["bleu d'auvergne", "bleu de bresse", "bleu de gex", "fourme", "fourmes"]},
-    },
-
-    # ===== SAVEURS =====
-    "Épices / Aromates": {
-        "piment":       {"label": "Pimenté",        "termes": ["piment", "piments", "pimente", "pimentes"]},
-        "paprika":      {"label": "Paprika",        "termes": ["paprika"]},
-        "espelette":    {"label": "Espelette",      "termes": ["espelette", "espel"]},
-        "poivres":      {"label": "Poivres",        "termes": ["poivre", "poivres"]},
-        "thym":         {"label": "Thym",           "termes": ["thym", "thyms"]},
-        "herbes":       {"label": "Aux herbes",     "termes": ["herbe", "herbes"]},
-        "ail":          {"label": "Ail",            "termes": ["ail", "ails"]},
-        "persillade":   {"label": "Persillade",     "termes": ["persillade", "persillades"]},
-        "persillee":    {"label": "Persillée",      "termes": ["persillee", "persillees", "persille", "persilles"]},
-    },
-
-    "Garnitures / Accompagnements": {
-        "oignons":      {"label": "Oignons",        "termes": ["oignon", "oignons"]},
-        "echalote":     {"label": "Échalote",       "termes": ["echalote", "echalotes"]},
-        "tomates":      {"label": "Tomates",        "termes": ["tomate", "tomates"]},
-        "legumes":      {"label": "Légumes",        "termes": ["legume", "legumes"]},
-        "mogette":      {"label": "Mogette",        "termes": ["mogette", "mogettes"]},
-        "coco":         {"label": "Coco",           "termes": ["coco", "cocos"]},
-        "pruneaux":     {"label": "Pruneaux",       "termes": ["pruneaux", "pruneau"]},
-        "abricots":     {"label": "Abricots",       "termes": ["abricots", "abricot"]},
-        "marrons":      {"label": "Marrons",        "termes": ["marron", "marrons"]},
-        "raisins":      {"label": "Raisins",        "termes": ["raisin", "raisins"]},
-        "citron":       {"label": "Citron",         "termes": ["citron", "citrons"]},
-        "orange":       {"label": "Orange",         "termes": ["orange", "oranges"]},
-        "melon":        {"label": "Melon",          "termes": ["melon"]},
-        "muscadet":     {"label": "Muscadet",       "termes": ["muscadet", "muscadets"]},
-        "biere":        {"label": "Bière",          "termes": ["biere", "bieres"]},
-        "miel":         {"label": "Miel",           "termes": ["miel", "miels"]},
-    },
-
-    "Styles": {
-        "nature":       {"label": "Nature",         "termes": ["nature", "natures", "nat"]},
-        "naturel":      {"label": "Naturel",        "termes": ["naturel", "naturels", "naturelle", "naturelles"]},
-        "trad":         {"label": "Traditionnelle", "termes": ["trad", "traditionnelle", "traditionnelles", "traditionnel", "traditionnels"]},
-        "fine":         {"label": "Fine",           "termes": ["fine", "fines"]},
-    },
-
-    # ===== AUTRES =====
-    "Autres": {
-        "foie_gras":    {"label": "Foie gras",      "termes": ["foie gras"]},
-        "magret":       {"label": "Magret",         "termes": ["magret", "magrets"]},
-    },
-}
+        QuerySet: Instances ComCli triées par tiers puis par préférence
+    """
+    principale = Q(complement__isnull=True) | Q(complement_nettoye='')
+    return (
+        ComCli.objects.using('logigvd')
+        .filter(tiers__in=codes_tiers)
+        .alias(complement_nettoye=Trim('complement'))
+        .alias(
+            secondaire=Case(When(principale, then=Value(0)), default=Value(1)),
+            complement_tri=Case(When(principale, then=Value('')), default=F('complement')),
+        )
+        .only(*CHAMPS_CLIENT_DISTANT)
+        .order_by('tiers', 'secondaire', 'complement_tri', 'nom')
+    )
+
+
+def _client_distant(comcli):
+    """Convertit une ligne comcli en objet simple (attributs CHAMPS_CLIENT_DISTANT)."""
+    return SimpleNamespace(**{champ: getattr(comcli, champ) for champ in CHAMPS_CLIENT_DISTANT})
 
 
 def get_client_distant(code_tiers):
     """
     Récupère les informations client depuis la base distante.
 
+    L'adresse principale du client (voir _adresses_clients) est mise en
+    cache CACHE_TIMEOUT_CLIENT secondes par code tiers, sous forme d'objet
+    simple (attributs tiers, nom, complement, adresse, cp, acheminement)
+    plutôt que d'instance de modèle.
+
     Args:
         code_tiers: Code tiers du client
 
     Returns:
-        Instance ComCli ou None
+        Objet avec les attributs du client, ou None
+
+    Note:
+        Seules les colonnes affichées (nom, adresse) et utilisées pour
+        l'EDI (tiers) sont chargées ; les dates restent différées.
+    """
+    cle = _cle_cache_client(code_tiers)
+    client = cache.get(cle, _ABSENT)
+    if client is _ABSENT:
+        comcli = _adresses_clients([code_tiers]).first()
+        # None est aussi mis en cache : un client inconnu n'est pas recherché à chaque page
+        client = _client_distant(comcli) if comcli else None
+        cache.set(cle, client, CACHE_TIMEOUT_CLIENT)
+    return client
+
+
+def get_clients_distants(codes_tiers):
+    """
+    Récupère en une fois les informations distantes de plusieurs clients.
+
+    Même cache et même choix d'adresse que get_client_distant : les
+    clients absents du cache sont lus en une seule requête.
+
+    Args:
+        codes_tiers (iterable): Codes tiers des clients
+
+    Returns:
+        dict: {code_tiers: client} ; un code tiers introuvable sur la base
+        distante est absent du dictionnaire (il n'est pas mis en cache ici)
+    """
+    cles = {code: _cle_cache_client(code) for code in codes_tiers}
+    if not cles:
+        return {}
+    en_cache = cache.get_many(cles.values())
+
+    manquants = [code for code, cle in cles.items() if cle not in en_cache]
+    if manquants:
+        lus = {}
+        for comcli in _adresses_clients(manquants):
+            # Première entrée de chaque client : son adresse principale
+            lus.setdefault(str(comcli.tiers), _client_distant(comcli))
+        nouveaux = {cles[code]: lus[code] for code in manquants if code in lus}
+        cache.set_many(nouveaux, CACHE_TIMEOUT_CLIENT)
+        en_cache.update(nouveaux)
+
+    return {code: en_cache[cle] for code, cle in cles.items() if cle in en_cache}
+
+
+# Durée de conservation du catalogue d'un client dans le cache (secondes)
+CACHE_TIMEOUT_PRODUITS = 300
+
+# Nombre de lignes lues par lot sur la base distante
+TAILLE_LOT_SQL = 1000
+
+
+# Seuil d'occurrences des filtres automatiques du catalogue complet
+SEUIL_FILTRES_CATALOGUE = 3
+
+
+def _cle_cache_produits(code_tiers):
+    """Clé de cache du catalogue d'un client (produits, filtres, index des tags)."""
+    return f"catalogue:{code_tiers}:v2"
+
+
+def _charger_catalogue_client(code_tiers):
+    """
+    Charge le catalogue d'un client depuis la base distante et prépare ses filtres.
+
+    Returns:
+        dict: {'produits': produits tagués, 'filtres_groupes': filtres
+        groupés pour l'affichage, 'index_tags': index inversé des tags}
+    """
+    produits, filtres_groupes, _ = preparer_filtres(
+        _charger_produits_client(code_tiers),
+        seuil_occurrences=SEUIL_FILTRES_CATALOGUE,
+        use_cache=False,
+    )
+    return {
+        'produits': produits,
+        'filtres_groupes': filtres_groupes,
+        'index_tags': construire_index_tags(produits),
+    }
+
+
+def get_catalogue_client(utilisateur, charger=True):
+    """
+    Récupère le catalogue complet d'un client : produits, filtres et index des tags.
+
+    Les trois sont conservés ensemble dans une seule entrée du cache Django
+    pendant CACHE_TIMEOUT_PRODUITS secondes : une page ne peut pas mélanger
+    deux chargements du catalogue. L'entrée est aussi mémorisée sur
+    l'instance utilisateur (propre à la requête) : les appels suivants de
+    la même requête ne relisent pas le cache.
+
+    Args:
+        utilisateur: Instance Utilisateur (avec code_tiers)
+        charger (bool): Charger le catalogue depuis la base distante s'il
+                        n'est pas en cache. Défaut: True
+
+    Returns:
+        dict: {'produits', 'filtres_groupes', 'index_tags'}, ou None sans
+        code tiers ou si le catalogue n'est pas en cache et charger=False
     """
-    return ComCli.objects.using('logigvd').filter(tiers=code_tiers).first()
+    code_tiers = utilisateur.code_tiers if hasattr(utilisateur, 'code_tiers') else None
+
+    if not code_tiers:
+        return None
+
+    catalogue = getattr(utilisateur, '_catalogue_client', None)
+    if catalogue is None:
+        if charger:
+            catalogue = cache.get_or_set(
+                _cle_cache_produits(code_tiers),
+                lambda: _charger_catalogue_client(code_tiers),
+                CACHE_TIMEOUT_PRODUITS,
+            )
+        else:
+            catalogue = cache.get(_cle_cache_produits(code_tiers))
+            if catalogue is None:
+                return None
+        utilisateur._catalogue_client = catalogue
+    return catalogue
 
 
 def get_produits_client(utilisateur):
     """
     Récupère la liste des produits avec prix pour un utilisateur.
-    Utilise une seule requête SQL avec JOINs pour optimiser les performances.
+
+    Les produits sont lus sur le catalogue du client (voir
+    get_catalogue_client), en cache et mémorisé pour la requête.
 
     Args:
         utilisateur: Instance Utilisateur (avec code_tiers)
@@ -345,117 +211,363 @@ def get_produits_client(utilisateur):
     Returns:
         Liste de dictionnaires avec les produits
     """
-    code_tiers = utilisateur.code_tiers if hasattr(utilisateur, 'code_tiers') else None
+    catalogue = get_catalogue_client(utilisateur)
+    return catalogue['produits'] if catalogue else []
 
-    if not code_tiers:
-        return []
 
-    with connections['logigvd'].cursor() as cursor:
-        # Requête 1 : catalogue + libellé produit + unite_fact (rapide, catalogue filtré par tiers)
-        cursor.execute("""
-            SELECT c.prod, p.libelle, p.unite_fact
-            FROM catalogue c
-            LEFT JOIN prod p ON c.prod = p.prod
-            WHERE c.tiers = %s
-        """, [code_tiers])
-        catalogue_rows = cursor.fetchall()
-
-        if not catalogue_rows:
-            return []
-
-        codes_produits = [r[0] for r in catalogue_rows]
-        libelles = {r[0]: r[1] for r in catalogue_rows}
-        unites_fact = {r[0]: r[2] for r in catalogue_rows}
-
-        # Requête 2 : prix et quantités depuis comclilig, filtré par client via comcli
-        placeholders = ','.join(['%s'] * len(codes_produits))
-        cursor.execute(f"""
-            SELECT l.prod, MAX(l.pu_base), MAX(l.qte), MAX(l.poids), MAX(l.colis)
+def _lire_par_lots(cursor, taille=TAILLE_LOT_SQL):
+    """Parcourt les lignes d'un curseur par lots plutôt qu'avec un seul fetchall()."""
+    while True:
+        rows = cursor.fetchmany(taille)
+        if not rows:
+            break
+        yield from rows
+
+
+def _requete_produits(code_tiers, references=None):
+    """
+    Construit la requête SQL du catalogue d'un client avec prix et quantités.
+
+    Les lignes de commande du client sont agrégées par produit dans une
+    sous-requête avant la jointure au catalogue : chaque produit ressort
+    une seule fois, sans multiplier les lignes par le nombre de commandes.
+
+    Args:
+        code_tiers: Code tiers du client
+        references: Codes produit recherchés, ou None pour tout le catalogue
+
+    Returns:
+        tuple: (requête SQL, paramètres). Colonnes : prod, libelle,
+        unite_fact, pu_base, qte, poids, colis
+    """
+    filtre_lignes = filtre_catalogue = ''
+    params_references = []
+    if references is not None:
+        marqueurs = ', '.join(['%s'] * len(references))
+        filtre_lignes = f" AND l.prod IN ({marqueurs})"
+        filtre_catalogue = f" AND c.prod IN ({marqueurs})"
+        params_references = list(references)
+
+    sql = f"""
+        SELECT c.prod, p.libelle, p.unite_fact, agg.pu, agg.q, agg.po, agg.co
+        FROM catalogue c
+        LEFT JOIN prod p ON c.prod = p.prod
+        LEFT JOIN (
+            SELECT l.prod, MAX(l.pu_base) pu, MAX(l.qte) q,
+                   MAX(l.poids) po, MAX(l.colis) co
             FROM comclilig l
-            INNER JOIN comcli c ON l.comcli = c.comcli AND l.lieusais = c.lieusais
-            WHERE c.tiers = %s AND l.prod IN ({placeholders})
+            JOIN comcli cc ON l.comcli = cc.comcli AND l.lieusais = cc.lieusais
+            WHERE cc.tiers = %s{filtre_lignes}
             GROUP BY l.prod
-        """, [code_tiers] + codes_produits)
-        lignes = {r[0]: r[1:] for r in cursor.fetchall()}
+        ) agg ON agg.prod = c.prod
+        WHERE c.tiers = %s{filtre_catalogue}
+    """
+    return sql, [code_tiers, *params_references, code_tiers, *params_references]
 
+
+def _charger_produits_client(code_tiers):
+    """
+    Charge le catalogue d'un client depuis la base distante.
+    Une seule requête SQL joint le catalogue aux lignes de commande du client
+    (voir _requete_produits).
+
+    Args:
+        code_tiers: Code tiers du client
+
+    Returns:
+        Liste de dictionnaires avec les produits
+    """
     produits = []
-    for prod_code in codes_produits:
-        ligne = lignes.get(prod_code)
-        libelle = libelles.get(prod_code) or prod_code
-        pu_base = float(ligne[0]) if ligne and ligne[0] else 0
-        poids = float(ligne[2]) if ligne and ligne[2] else 0
-        colis = int(ligne[3]) if ligne and ligne[3] else 0
-
-        # Déterminer l'unité de vente depuis unite_fact de la table prod
-        # 1 = unité, 2 = poids (kg)
-        unite_fact = unites_fact.get(prod_code)
-        if unite_fact == 1:
-            unite = 'unité'
-        elif unite_fact == 2:
-            unite = 'kg'
-        else:
-            unite = 'unité'  # Par défaut
-
-        if pu_base <= 0:
-            continue
-
-        # Générer les tags à partir du libellé pour le filtrage
-        nom_normalise = _normaliser(libelle) if libelle else ''
-        tags = [
-            code
-            for groupe in FILTRES_DISPONIBLES.values()
-            for code, info in groupe.items()
-            if any(terme in nom_normalise for terme in info["termes"])
-        ]
-
-        # Tags basés sur l'unité de vente (unite_fact: 1=unité, 2=kg)
-        if unite == 'kg':
-            tags.append('kg')
-        elif unite == 'unité':
-            tags.append('unite')
-
-        produit = {
-            'prod': prod_code,
-            'reference': prod_code,
-            'libelle': libelle,
-            'nom': libelle,
-            'pu_base': pu_base,
-            'prix': pu_base,
-            'unite': unite,
-            'nb_commandes': int(ligne[1]) if ligne and ligne[1] else 0,
-            'poids': poids,
-            'colis': colis,
-            'tags': tags,
-        }
-        produits.append(produit)
+    # Libellés identiques partagés entre produits (un seul objet en mémoire et dans le cache)
+    libelles = {}
+
+    with connections['logigvd'].cursor() as cursor:
+        # Catalogue + libellé produit + unite_fact, avec prix et quantités depuis comclilig
+        cursor.execute(*_requete_produits(code_tiers))
+
+        for prod_code, libelle, unite_fact, *ligne in _lire_par_lots(cursor):
+            if libelle:
+                libelle = libelles.setdefault(libelle, libelle)
+            produit = _construire_produit(prod_code, libelle, unite_fact, ligne)
+            if produit:
+                produits.append(produit)
 
     return produits
 
 
-def get_categories_client(utilisateur):
+def texte_recherche(produit):
+    """
+    Texte en minuscules sur lequel porte la recherche d'un produit.
+
+    Libellé et code produit sont réunis, séparés par un caractère nul pour
+    qu'une recherche ne puisse pas correspondre à cheval sur les deux.
     """
-    Récupère les catégories disponibles pour un utilisateur.
+    return f"{produit.get('libelle', '')}\x00{produit.get('prod', '')}".lower()
+
+
+def _construire_produit(prod_code, libelle, unite_fact, ligne):
+    """
+    Construit le dictionnaire d'un produit à partir des données distantes.
+
+    Args:
+        prod_code: Code produit
+        libelle: Libellé du produit (peut être None)
+        unite_fact: Unité de facturation (1 = unité, 2 = kg)
+        ligne: Séquence (pu_base, qte, poids, colis) issue de comclilig, ou None
+
+    Returns:
+        Dictionnaire du produit, ou None si le produit n'a pas de prix
+    """
+    libelle = libelle or prod_code
+    pu_base = float(ligne[0]) if ligne and ligne[0] else 0
+    poids = float(ligne[2]) if ligne and ligne[2] else 0
+    colis = int(ligne[3]) if ligne and ligne[3] else 0
+
+    # Déterminer l'unité de vente depuis unite_fact de la table prod
+    # 1 = unité, 2 = poids (kg)
+    if unite_fact == 1:
+        unite = 'unité'
+    elif unite_fact == 2:
+        unite = 'kg'
+    else:
+        unite = 'unité'  # Par défaut
+
+    if pu_base <= 0:
+        return None
+
+    # Générer les tags à partir du libellé pour le filtrage
+    tags = list(_tags_manuels(libelle))
+
+    # Tags basés sur l'unité de vente (unite_fact: 1=unité, 2=kg)
+    if unite == 'kg':
+        tags.append('kg')
+    elif unite == 'unité':
+        tags.append('unite')
+
+    produit = {
+        'prod': prod_code,
+        'reference': prod_code,
+        'libelle': libelle,
+        'nom': libelle,
+        'pu_base': pu_base,
+        'prix': pu_base,
+        'unite': unite,
+        'nb_commandes': int(ligne[1]) if ligne and ligne[1] else 0,
+        'poids': poids,
+        'colis': colis,
+        'tags': tags,
+    }
+    # Texte de recherche calculé une fois, conservé avec le catalogue en cache
+    produit['texte_recherche'] = texte_recherche(produit)
+    return produit
+
+
+def _charger_produit(code_tiers, reference):
+    """
+    Charge un seul produit du catalogue d'un client depuis la base distante.
+
+    Utilisé quand le catalogue complet n'est pas en cache : une requête
+    ciblée évite de charger tout le catalogue pour un seul produit.
+
+    Args:
+        code_tiers: Code tiers du client
+        reference: Code produit recherché
+
+    Returns:
+        Dictionnaire du produit ou None
+    """
+    with connections['logigvd'].cursor() as cursor:
+        cursor.execute(*_requete_produits(code_tiers, [reference]))
+        row = cursor.fetchone()
+
+    if not row:
+        return None
+    return _construire_produit(row[0], row[1], row[2], row[3:])
+
+
+def _charger_produits_references(code_tiers, references):
+    """
+    Charge plusieurs produits du catalogue d'un client en une seule requête.
+
+    Pendant de _charger_produit pour un lot de références (panier, favoris)
+    quand le catalogue complet n'est pas en cache.
+
+    Args:
+        code_tiers: Code tiers du client
+        references: Liste de codes produit recherchés
 
     Returns:
-        Liste de noms de catégories
+        Dictionnaire {référence: produit} limité aux produits trouvés
     """
-    produits = get_produits_client(utilisateur)
-    categories = set()
-    for p in produits:
-        for cat in p.get('categories', []):
-            categories.add(cat)
-    return sorted(categories)
+    produits = {}
+    for debut in range(0, len(references), TAILLE_LOT_SQL):
+        lot = references[debut:debut + TAILLE_LOT_SQL]
+        with connections['logigvd'].cursor() as cursor:
+            cursor.execute(*_requete_produits(code_tiers, lot))
+            for row in cursor.fetchall():
+                produit = _construire_produit(row[0], row[1], row[2], row[3:])
+                if produit:
+                    produits[produit['reference']] = produit
+    return produits
 
 
 def get_produit_by_reference(utilisateur, reference):
     """
     Récupère un produit par sa référence.
 
+    L'index {référence: produit} est construit en mémoire à partir du
+    catalogue en cache. Si le catalogue n'est pas en cache, seul le produit
+    demandé est chargé.
+
     Returns:
         Dictionnaire du produit ou None
     """
-    produits = get_produits_client(utilisateur)
-    for p in produits:
-        if p['reference'] == reference:
-            return p
-    return None
+    code_tiers = utilisateur.code_tiers if hasattr(utilisateur, 'code_tiers') else None
+
+    if not code_tiers:
+        return None
+
+    index = get_produits_index(utilisateur, charger=False)
+    if index is None:
+        return _charger_produit(code_tiers, reference)
+    return index.get(reference)
+
+
+def get_produits_by_references(utilisateur, references):
+    """
+    Récupère plusieurs produits par leurs références en un seul accès.
+
+    Remplace une série d'appels à get_produit_by_reference (favoris, panier) :
+    l'index du catalogue n'est lu qu'une fois pour toutes les références.
+    Si le catalogue n'est pas en cache, seules les références demandées
+    sont chargées, en une seule requête.
+
+    Args:
+        utilisateur: Utilisateur dont on consulte le catalogue
+        references: Itérable de références produit
+
+    Returns:
+        Dictionnaire {référence: produit} limité aux références trouvées
+        (vide sans lecture du catalogue si aucune référence n'est demandée)
+    """
+    code_tiers = utilisateur.code_tiers if hasattr(utilisateur, 'code_tiers') else None
+
+    if not references or not code_tiers:
+        return {}
+
+    index = get_produits_index(utilisateur, charger=False)
+    if index is None:
+        return _charger_produits_references(code_tiers, list(references))
+    return {ref: index[ref] for ref in references if ref in index}
+
+
+def recap_panier(panier, index):
+    """
+    Construit le détail du panier à partir de l'index des produits du client.
+
+    Chaque ligne est résolue par une simple recherche dans l'index, sans
+    accès à la base par référence.
+
+    Args:
+        panier (dict): Panier en session {reference: quantite}
+        index (dict): Index {reference: produit} du catalogue du client
+
+    Returns:
+        tuple: (lignes_panier, total_panier). Les références absentes
+        du catalogue sont ignorées.
+    """
+    lignes_panier = []
+    total_panier = 0
+    for reference, quantite in panier.items():
+        produit = index.get(reference)
+        if produit:
+            # Calcul du total de la ligne (prix unitaire × quantité)
+            ligne_total = produit['prix'] * quantite
+            lignes_panier.append({
+                'reference': reference,
+                'nom': produit['nom'],
+                'quantite': quantite,
+                'prix': produit['prix'],
+                'total': ligne_total,
+            })
+            total_panier += ligne_total
+    return lignes_panier, total_panier
+
+
+def get_produits_index(utilisateur, charger=True):
+    """
+    Récupère l'index {référence: produit} du catalogue d'un utilisateur.
+
+    L'index est construit en mémoire à partir du catalogue en cache et
+    mémorisé sur l'instance utilisateur pour la durée de la requête.
+
+    Args:
+        utilisateur: Instance Utilisateur (avec code_tiers)
+        charger (bool): Charger le catalogue depuis la base distante s'il
+                        n'est pas en cache. Défaut: True
+
+    Returns:
+        Dictionnaire {référence: produit} (vide si pas de code tiers), ou
+        None si le catalogue n'est pas en cache et charger=False
+    """
+    code_tiers = utilisateur.code_tiers if hasattr(utilisateur, 'code_tiers') else None
+
+    if not code_tiers:
+        return {}
+
+    index = getattr(utilisateur, '_index_produits', None)
+    if index is None:
+        catalogue = get_catalogue_client(utilisateur, charger=charger)
+        if catalogue is None:
+            return None
+        index = {p['reference']: p for p in catalogue['produits']}
+        utilisateur._index_produits = index
+    return index
+
+
+# Durée de conservation des références favorites d'un utilisateur (secondes)
+CACHE_TIMEOUT_FAVORIS = 3600
+
+# Nombre de références favorites conservées en cache (page Favoris)
+NB_FAVORIS_MAX = 12
+
+
+def _cle_cache_favoris(utilisateur_id):
+    """Clé de cache des références les plus commandées par un utilisateur."""
+    return f"favoris:{utilisateur_id}:v1"
+
+
+def get_top_references(utilisateur, n=NB_FAVORIS_MAX):
+    """
+    Récupère les références les plus commandées par un utilisateur.
+
+    Le classement (jusqu'à NB_FAVORIS_MAX références) est mis en cache :
+    il ne change qu'à la création, la suppression ou la restauration d'une
+    commande, qui appellent invalider_top_references. Les tuples sont lus
+    directement depuis le curseur, sans cache de résultats du QuerySet.
+
+    Args:
+        utilisateur: Instance Utilisateur
+        n: Nombre de références à retourner (au plus NB_FAVORIS_MAX)
+
+    Returns:
+        Liste de tuples (reference_produit, total_commande) par total décroissant
+    """
+    top_references = cache.get_or_set(
+        _cle_cache_favoris(utilisateur.id),
+        lambda: list(
+            LigneCommande.objects
+            .filter(commande__utilisateur_id=utilisateur.id)
+            .values_list('reference_produit')
+            .annotate(total_commande=Sum('quantite'))
+            .order_by('-total_commande')[:NB_FAVORIS_MAX]
+            .iterator()
+        ),
+        CACHE_TIMEOUT_FAVORIS,
+    )
+    return top_references[:n]
+
+
+def invalider_top_references(utilisateur_id):
+    """Supprime du cache les références favorites d'un utilisateur."""
+    cache.delete(_cle_cache_favoris(utilisateur_id))
@@ -0,0 +1,25 @@
+"""
+=============================================================================
+CATALOGUE_EXTRAS.PY - Filtres de template du catalogue
+=============================================================================
+
+Filtres disponibles (après {% load catalogue_extras %}) :
+    - get_item : lecture d'une clé dans un dictionnaire
+
+Projet : Extranet Giffaud Groupe
+=============================================================================
+"""
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def get_item(dictionnaire, cle):
+    """
+    Retourne la valeur associée à une clé d'un dictionnaire (None si absente).
+
+    Exemple:
+        {{ panier_map|get_item:produit.reference|default:0 }}
+    """
+    return dictionnaire.get(cle)
@@ -6,6 +6,8 @@ TESTS.PY - Tests de l'application Catalogue
 Tests couverts :
     - Vues : liste_produits, favoris, detail_produit, mentions_legales, commander
     - Acces : verification des redirections pour utilisateurs non connectes
+    - Services : cache du catalogue client, requete SQL du catalogue,
+      construction des produits, recapitulatif du panier, filtres automatiques
 
 Note :
     Les modeles de cette application (Prod, ComCli, ComCliLig, Catalogue)
@@ -16,11 +18,22 @@ Note :
 Projet : Extranet Giffaud Groupe
 =============================================================================
 """
+import sqlite3
+import unicodedata
+from copy import deepcopy
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import patch
+
 from django.test import TestCase
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.urls import reverse
 
 from clients.models import Utilisateur
+from commandes.models import Commande, LigneCommande
+from . import services
+from .filtres import _normaliser, generer_filtres_automatiques
 
 
 # =============================================================================
@@ -33,6 +46,12 @@ def creer_utilisateur(username='client1', password='testpass1234', code_tiers='C
     return user, utilisateur
 
 
+PRODUITS_TEST = [
+    {'reference': 'P001', 'prod': 'P001', 'nom': 'Saucisse', 'libelle': 'Saucisse', 'prix': 5.0, 'tags': []},
+    {'reference': 'P002', 'prod': 'P002', 'nom': 'Jambon', 'libelle': 'Jambon', 'prix': 8.0, 'tags': []},
+]
+
+
 # =============================================================================
 # TESTS DES VUES
 # =============================================================================
@@ -59,3 +78,314 @@ class CatalogueAccesTest(TestCase):
     def test_commander_non_connecte(self):
         response = self.client.get(reverse('catalogue:commander'))
         self.assertEqual(response.status_code, 302)
+
+
+@patch('catalogue.services._charger_produits_client', side_effect=lambda code_tiers: deepcopy(PRODUITS_TEST))
+class CatalogueClientConnecteTest(TestCase):
+    """Tests des vues du catalogue pour un client connecté."""
+
+    def setUp(self):
+        cache.clear()
+        self.user, self.utilisateur = creer_utilisateur()
+        self.client.login(username='client1', password='testpass1234')
+        commande = Commande.objects.create(
+            utilisateur=self.utilisateur, numero='CMD-20260212-0001', total_ht='16.00'
+        )
+        LigneCommande.objects.create(
+            commande=commande, reference_produit='P002', nom_produit='Jambon',
+            quantite=2, prix_unitaire=Decimal('8.00')
+        )
+        session = self.client.session
+        session['panier'] = {'P001': 3}
+        session.save()
+
+    def test_liste_favoris_et_panier(self, mock_charger):
+        response = self.client.get(reverse('catalogue:liste'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['reference'] for p in response.context['produits_favoris']], ['P002'])
+        self.assertEqual([p['reference'] for p in response.context['produits']], ['P001'])
+        self.assertEqual(response.context['total_panier'](), 15.0)
+        self.assertEqual(mock_charger.call_count, 1)
+
+    @patch('catalogue.views.get_client_distant', return_value=None)
+    def test_commander_quantites_du_panier(self, mock_client, mock_charger):
+        response = self.client.get(reverse('catalogue:commander'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'name="qte_P001"')
+        self.assertContains(response, 'value="3"')
+        self.assertEqual(response.context['panier_map'], {'P001': 3})
+        self.assertNotIn('panier_qte', response.context['produits'][0])
+
+    def test_commander_post_quantites_soumises(self, mock_charger):
+        response = self.client.post(reverse('catalogue:commander'), {
+            'qte_P001': '2', 'qte_P002': '', 'qte_P999': '4', 'commentaires': 'Merci',
+        })
+        self.assertRedirects(response, reverse('commandes:valider'), fetch_redirect_response=False)
+        self.assertEqual(self.client.session['panier'], {'P001': 2})
+
+    def test_commander_post_quantite_non_decimale(self, mock_charger):
+        response = self.client.post(reverse('catalogue:commander'), {
+            'qte_P001': '²', 'qte_P002': '1',
+        })
+        self.assertRedirects(response, reverse('commandes:valider'), fetch_redirect_response=False)
+        self.assertEqual(self.client.session['panier'], {'P002': 1})
+
+    def test_favoris(self, mock_charger):
+        response = self.client.get(reverse('catalogue:favoris'))
+        self.assertEqual(response.status_code, 200)
+        favoris = response.context['produits_favoris']
+        self.assertEqual([p['reference'] for p in favoris], ['P002'])
+        self.assertEqual(favoris[0]['total_commande'], 2)
+        # Le produit du catalogue en cache n'est pas modifié
+        self.assertNotIn('total_commande', services.get_produits_index(self.utilisateur)['P002'])
+        self.assertEqual(response.context['total_panier'](), 15.0)
+
+
+# =============================================================================
+# TESTS DES SERVICES
+# =============================================================================
+
+@patch('catalogue.services._charger_produits_client', side_effect=lambda code_tiers: deepcopy(PRODUITS_TEST))
+class CacheProduitsTest(TestCase):
+    """Tests du cache du catalogue client."""
+
+    def setUp(self):
+        cache.clear()
+        self.utilisateur = SimpleNamespace(code_tiers='CLI001')
+
+    def test_catalogue_charge_une_seule_fois(self, mock_charger):
+        services.get_produits_client(self.utilisateur)
+        services.get_produits_client(self.utilisateur)
+        self.assertEqual(mock_charger.call_count, 1)
+
+    def test_produit_par_reference(self, mock_charger):
+        services.get_produits_client(self.utilisateur)
+        produit = services.get_produit_by_reference(self.utilisateur, 'P002')
+        self.assertEqual(produit['nom'], 'Jambon')
+        self.assertIsNone(services.get_produit_by_reference(self.utilisateur, 'P999'))
+
+    @patch('catalogue.services._charger_produit', return_value=PRODUITS_TEST[0])
+    def test_produit_sans_catalogue_en_cache(self, mock_produit, mock_charger):
+        produit = services.get_produit_by_reference(self.utilisateur, 'P001')
+        self.assertEqual(produit['nom'], 'Saucisse')
+        mock_produit.assert_called_once_with(self.utilisateur.code_tiers, 'P001')
+        mock_charger.assert_not_called()
+
+    @patch('catalogue.services._charger_produit')
+    def test_memorisation_par_requete(self, mock_produit, mock_charger):
+        services.get_produits_client(self.utilisateur)
+        cache.clear()
+        # Le catalogue déjà lu pendant la requête est réutilisé sans le cache
+        produit = services.get_produit_by_reference(self.utilisateur, 'P001')
+        self.assertEqual(produit['nom'], 'Saucisse')
+        mock_produit.assert_not_called()
+        self.assertEqual(mock_charger.call_count, 1)
+
+    def test_produits_par_references(self, mock_charger):
+        services.get_produits_client(self.utilisateur)
+        produits = services.get_produits_by_references(self.utilisateur, ['P002', 'P999'])
+        self.assertEqual(list(produits), ['P002'])
+        self.assertEqual(mock_charger.call_count, 1)
+
+    @patch('catalogue.services._charger_produits_references',
+           return_value={'P002': PRODUITS_TEST[1]})
+    def test_produits_par_references_sans_catalogue_en_cache(self, mock_lot, mock_charger):
+        produits = services.get_produits_by_references(self.utilisateur, {'P002': 1, 'P999': 2})
+        self.assertEqual(list(produits), ['P002'])
+        mock_lot.assert_called_once_with(self.utilisateur.code_tiers, ['P002', 'P999'])
+        mock_charger.assert_not_called()
+
+    def test_recap_panier(self, mock_charger):
+        services.get_produits_client(self.utilisateur)
+        index = services.get_produits_by_references(self.utilisateur, ['P001', 'P002', 'P999'])
+        lignes, total = services.recap_panier({'P001': 2, 'P999': 1, 'P002': 1}, index)
+        self.assertEqual([l['reference'] for l in lignes], ['P001', 'P002'])
+        self.assertEqual(total, 18.0)
+        self.assertEqual(mock_charger.call_count, 1)
+
+    def test_index_produits(self, mock_charger):
+        index = services.get_produits_index(self.utilisateur)
+        self.assertEqual(sorted(index), ['P001', 'P002'])
+        self.assertEqual(services.get_produits_index(SimpleNamespace(code_tiers='')), {})
+
+    def test_index_produits_sans_chargement(self, mock_charger):
+        self.assertIsNone(services.get_produits_index(self.utilisateur, charger=False))
+        mock_charger.assert_not_called()
+        services.get_produits_client(self.utilisateur)
+        self.assertEqual(sorted(services.get_produits_index(self.utilisateur, charger=False)),
+                         ['P001', 'P002'])
+
+    def test_catalogue_une_seule_entree_de_cache(self, mock_charger):
+        index = services.get_produits_index(self.utilisateur)
+        catalogue = cache.get(services._cle_cache_produits('CLI001'))
+        self.assertEqual(set(catalogue), {'produits', 'filtres_groupes', 'index_tags'})
+        # Nouvelle requête : l'index est reconstruit en mémoire depuis la même entrée
+        autre_requete = SimpleNamespace(code_tiers='CLI001')
+        self.assertEqual(services.get_produits_index(autre_requete), index)
+        self.assertEqual(mock_charger.call_count, 1)
+
+    def test_sans_code_tiers(self, mock_charger):
+        self.assertEqual(services.get_produits_client(SimpleNamespace(code_tiers='')), [])
+        mock_charger.assert_not_called()
+
+
+class RequeteProduitsTest(TestCase):
+    """Tests de la requête SQL du catalogue client (exécutée sur SQLite en mémoire)."""
+
+    def setUp(self):
+        self.connexion = sqlite3.connect(':memory:')
+        self.connexion.executescript("""
+            CREATE TABLE catalogue (tiers TEXT, prod TEXT);
+            CREATE TABLE prod (prod TEXT, libelle TEXT, unite_fact INTEGER);
+            CREATE TABLE comcli (comcli INTEGER, lieusais INTEGER, tiers TEXT);
+            CREATE TABLE comclilig (comcli INTEGER, lieusais INTEGER, prod TEXT,
+                                    pu_base REAL, qte INTEGER, poids REAL, colis INTEGER);
+            INSERT INTO catalogue VALUES ('CLI001', 'P001'), ('CLI001', 'P002'), ('CLI002', 'P001');
+            INSERT INTO prod VALUES ('P001', 'Saucisse', 2), ('P002', 'Jambon', 1);
+            INSERT INTO comcli VALUES (1, 1, 'CLI001'), (2, 1, 'CLI001'), (3, 1, 'CLI002');
+            INSERT INTO comclilig VALUES
+                (1, 1, 'P001', 5.1, 3, 0, 0), (2, 1, 'P001', 5.5, 1, 0, 0),
+                (3, 1, 'P001', 9.9, 7, 0, 0);
+        """)
+        self.addCleanup(self.connexion.close)
+
+    def _executer(self, *args):
+        sql, params = services._requete_produits(*args)
+        return sorted(self.connexion.execute(sql.replace('%s', '?'), params).fetchall())
+
+    def test_une_ligne_par_produit_agregee_sur_le_client(self):
+        self.assertEqual(self._executer('CLI001'), [
+            ('P001', 'Saucisse', 2, 5.5, 3, 0, 0),
+            ('P002', 'Jambon', 1, None, None, None, None),
+        ])
+
+    def test_filtre_par_references(self):
+        self.assertEqual(self._executer('CLI001', ['P001']), [('P001', 'Saucisse', 2, 5.5, 3, 0, 0)])
+        self.assertEqual(self._executer('CLI002', ['P001', 'P002']), [('P001', 'Saucisse', 2, 9.9, 7, 0, 0)])
+
+
+class ConstruireProduitTest(TestCase):
+    """Tests de la construction d'un produit depuis la base distante."""
+
+    def test_texte_recherche_precalcule(self):
+        produit = services._construire_produit('P001', 'Saucisse Fumée', 2, (5, 3, 0, 0))
+        self.assertEqual(produit['texte_recherche'], 'saucisse fumée\x00p001')
+        self.assertEqual(produit['unite'], 'kg')
+
+    def test_sans_prix(self):
+        self.assertIsNone(services._construire_produit('P001', 'Saucisse', 1, None))
+
+
+class FiltresAutomatiquesTest(TestCase):
+    """Tests de la génération des filtres automatiques."""
+
+    def test_normaliser(self):
+        self.assertEqual(_normaliser('Pâté Forestière'), 'pate forestiere')
+        self.assertEqual(_normaliser('JAMBON'), 'jambon')
+
+    def test_normaliser_caracteres_non_decomposables(self):
+        def normaliser_ascii(texte):
+            return unicodedata.normalize('NFD', texte).encode('ascii', 'ignore').decode('ascii').lower()
+
+        for libelle in ('Côte de Bœuf', 'Jambon\u00a0Sec', 'Pâté d\u2019Œuf', 'Saucisse\u202fFumée'):
+            self.assertEqual(_normaliser(libelle), normaliser_ascii(libelle))
+        self.assertEqual(_normaliser('Bœuf\u00a0Haché'), 'bufhache')
+
+    def test_filtres_automatiques_en_ascii(self):
+        produits = [{'libelle': 'Bœuf Bourguignon'}, {'libelle': 'Bœuf Haché'}, {'libelle': 'Bœuf\u00a0Braisé'}]
+        filtres = generer_filtres_automatiques(produits, seuil_occurrences=2)
+        self.assertTrue(all(code.isascii() for code in filtres))
+        self.assertNotIn('auto_b\u0153uf', filtres)
+        self.assertNotIn('auto_braise', filtres)
+
+    def test_mots_frequents_hors_exclusions(self):
+        produits = [
+            {'libelle': 'Terrine Dupont'},
+            {'libelle': 'Pâté Dupont Dupont'},
+            {'libelle': 'Rillettes de Dupont'},
+        ]
+        filtres = generer_filtres_automatiques(produits, seuil_occurrences=2)
+        # "dupont" n'est compté qu'une fois par produit
+        self.assertEqual(filtres['auto_dupont']['count'], 3)
+        # "de" est un mot ignoré et "pate" un terme des filtres manuels
+        self.assertNotIn('auto_de', filtres)
+        self.assertNotIn('auto_pate', filtres)
+
+    def test_top_k(self):
+        produits = [{'libelle': 'Dupont Durand'}] * 3 + [{'libelle': 'Dupont'}]
+        filtres = generer_filtres_automatiques(produits, seuil_occurrences=2, top_k=1)
+        self.assertEqual(list(filtres), ['auto_dupont'])
+
+
+class TopReferencesTest(TestCase):
+    """Tests du cache des références les plus commandées."""
+
+    def setUp(self):
+        cache.clear()
+        _, self.utilisateur = creer_utilisateur()
+        self.commande = Commande.objects.create(
+            utilisateur=self.utilisateur, numero='CMD-20260212-0002', total_ht='0'
+        )
+
+    def ajouter_ligne(self, reference, quantite):
+        LigneCommande.objects.create(
+            commande=self.commande, reference_produit=reference, nom_produit=reference,
+            quantite=quantite, prix_unitaire=Decimal('1.00')
+        )
+
+    def test_classement_et_invalidation(self):
+        self.ajouter_ligne('P001', 2)
+        self.ajouter_ligne('P002', 5)
+        self.assertEqual(services.get_top_references(self.utilisateur, 1), [('P002', 5)])
+
+        self.ajouter_ligne('P001', 10)
+        # Classement servi depuis le cache tant qu'il n'est pas invalidé
+        self.assertEqual(services.get_top_references(self.utilisateur)[0], ('P002', 5))
+        services.invalider_top_references(self.utilisateur.id)
+        self.assertEqual(services.get_top_references(self.utilisateur)[0], ('P001', 12))
+
+
+class ClientDistantCacheTest(TestCase):
+    """Tests du cache des informations client distantes."""
+
+    def setUp(self):
+        cache.clear()
+
+    @patch('catalogue.services._adresses_clients')
+    def test_client_mis_en_cache(self, mock_adresses):
+        mock_adresses.return_value.first.return_value = SimpleNamespace(
+            tiers='CLI001', nom='CLIENT TEST', complement='', adresse='1 rue Test',
+            cp='44000', acheminement='NANTES'
+        )
+        client = services.get_client_distant('CLI001')
+        self.assertEqual(client.nom, 'CLIENT TEST')
+        self.assertEqual(services.get_client_distant('CLI001').acheminement, 'NANTES')
+        mock_adresses.assert_called_once_with(['CLI001'])
+
+    @patch('catalogue.services._adresses_clients')
+    def test_client_inconnu_mis_en_cache(self, mock_adresses):
+        mock_adresses.return_value.first.return_value = None
+        self.assertIsNone(services.get_client_distant('INCONNU'))
+        self.assertIsNone(services.get_client_distant('INCONNU'))
+        self.assertEqual(mock_adresses.call_count, 1)
+
+    def test_adresses_clients_ordre(self):
+        sql, _ = services._adresses_clients(['1']).query.sql_with_params()
+        # Une seule requête, colonnes de l'adresse uniquement, sans complément d'abord
+        self.assertNotIn('date_liv', sql)
+        self.assertIn('ORDER BY "comcli"."tiers" ASC, CASE WHEN', sql)
+
+    @patch('catalogue.services._adresses_clients')
+    def test_clients_distants_meme_cache(self, mock_adresses):
+        mock_adresses.return_value = [
+            SimpleNamespace(tiers=1, nom='CLIENT UN', complement='', adresse='1 rue A',
+                            cp='44000', acheminement='NANTES'),
+            SimpleNamespace(tiers=1, nom='CLIENT UN', complement='Quai 2', adresse='2 rue A',
+                            cp='44000', acheminement='NANTES'),
+        ]
+        clients = services.get_clients_distants(['1', '2'])
+        self.assertEqual(list(clients), ['1'])
+        self.assertEqual(clients['1'].adresse, '1 rue A')
+        # Lu ensuite depuis le cache par get_client_distant
+        self.assertEqual(services.get_client_distant('1').adresse, '1 rue A')
+        self.assertEqual(mock_adresses.call_count, 1)
@@ -27,19 +27,58 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import Http404
-from django.db.models import Sum
 from django.core.paginator import Paginator
+from django.urls import reverse
+from functools import lru_cache
+from clients.decorators import utilisateur_required
 # Import des services métier pour l'accès aux données produits
-from .services import get_produits_client, get_produit_by_reference, get_client_distant
+from .services import (
+    get_produit_by_reference, get_produits_index, get_client_distant,
+    get_top_references,
+)
 
 # Import des fonctions de filtrage partagées avec le module administration
-from administration.views.utils.filtres import preparer_filtres, appliquer_filtres
+from administration.views.utils.filtres import (
+    preparer_filtres, preparer_filtres_client, appliquer_filtres,
+)
 
-# Import des modèles de commandes
-from commandes.models import LigneCommande
+
+@lru_cache(maxsize=None)
+def _url(nom):
+    """
+    Résout une URL nommée une seule fois par processus.
+
+    Les URLs de redirection des vues (connexion, commande) sont fixes :
+    inutile de repasser par le résolveur d'URL à chaque requête.
+    """
+    return reverse(nom)
+
+
+def _produits_favoris(utilisateur, index, n):
+    """
+    Construit les n produits favoris d'un utilisateur depuis l'index du catalogue.
+
+    Chaque favori est une copie du produit enrichie du total commandé : les
+    produits partagés de l'index ne sont pas modifiés. Les références qui ne
+    sont plus au catalogue sont ignorées.
+
+    Args:
+        utilisateur: Instance Utilisateur
+        index (dict): Index {reference: produit} du catalogue du client
+        n (int): Nombre de références favorites à considérer
+
+    Returns:
+        list: Produits favoris, du plus commandé au moins commandé
+    """
+    return [
+        dict(index[reference], total_commande=total_commande)
+        for reference, total_commande in get_top_references(utilisateur, n)
+        if reference in index
+    ]
 
 
 @login_required
+@utilisateur_required
 def liste_produits(request):
     """
     Affiche la liste des produits disponibles pour le client connecté.
@@ -64,29 +103,18 @@ def liste_produits(request):
                 - filtres_groupes: Groupes de filtres disponibles
                 - filtres_actifs: Liste des filtres actuellement appliqués
                 - recherche: Terme de recherche actuel
-                - lignes_panier: Détail des lignes du panier
-                - total_panier: Montant total du panier
+                - lignes_panier, total_panier: fournis par le context processor
+                  catalogue.context_processors.panier_recap
 
     Note:
         Les produits favoris ne sont affichés que si aucun filtre ni recherche
         n'est actif, afin de ne pas les dupliquer dans les résultats filtrés.
     """
+    # Objet utilisateur métier (lié au User Django), vérifié par le décorateur
+    utilisateur = request.utilisateur
 
-    # Vérification que l'utilisateur Django a bien un profil utilisateur associé
-    # Cette relation est nécessaire pour accéder au catalogue personnalisé du client
-    if not hasattr(request.user, 'utilisateur'):
-        messages.error(
-            request,
-            "Votre compte n'est pas associé à un profil utilisateur. Contactez l'administrateur."
-        )
-        return redirect('clients:connexion')
-
-    # Récupération de l'objet utilisateur métier (lié au User Django)
-    utilisateur = request.user.utilisateur
-
-    # Récupération de tous les produits disponibles pour ce client
-    # La liste dépend du code_tiers de l'utilisateur et de son tarif associé
-    produits = get_produits_client(utilisateur)
+    # Index {référence: produit} partagé par les favoris et le panier
+    index = get_produits_index(utilisateur)
 
     # =========================================================================
     # PRÉPARATION DES FILTRES
@@ -94,14 +122,15 @@ def liste_produits(request):
     # Utilisation de la même logique de filtrage que côté administration
     # Le seuil d'occurrences (3) définit le nombre minimum de produits
     # qu'une valeur de filtre doit avoir pour être affichée
-    produits, filtres_groupes, _ = preparer_filtres(produits, seuil_occurrences=3)
+    # Produits tagués, filtres et index des tags sont mis en cache par client
+    produits, filtres_groupes, index_tags = preparer_filtres_client(utilisateur, seuil_occurrences=3)
 
     # Récupération des paramètres de filtrage depuis l'URL (GET)
     filtres_actifs = request.GET.getlist("filtre")  # Peut contenir plusieurs valeurs
     recherche = request.GET.get('q', '').strip()     # Terme de recherche textuelle
 
     # Application des filtres et de la recherche sur la liste de produits
-    produits_filtres = appliquer_filtres(produits, filtres_actifs, recherche)
+    produits_filtres = appliquer_filtres(produits, filtres_actifs, recherche, index_tags)
     produits = produits_filtres
 
     # =========================================================================
@@ -111,33 +140,18 @@ def liste_produits(request):
     # Ils sont affichés en priorité uniquement sans filtre ni recherche active
     produits_favoris = []
     if not filtres_actifs and not recherche:
-        # Requête d'agrégation pour obtenir les 4 références les plus commandées
-        # On somme les quantités commandées pour chaque référence produit
-        top_references = (
-            LigneCommande.objects
-            .filter(commande__utilisateur=utilisateur)
-            .values('reference_produit')
-            .annotate(total_commande=Sum('quantite'))
-            .order_by('-total_commande')[:4]
-        )
-
-        # Récupération des informations complètes de chaque produit favori
-        # depuis la base de données distante
-        for entry in top_references:
-            produit = get_produit_by_reference(
-                utilisateur,
-                entry['reference_produit']
-            )
-            if produit:
-                produits_favoris.append(produit)
+        # Les 4 produits les plus commandés (somme des quantités, en cache)
+        produits_favoris = _produits_favoris(utilisateur, index, 4)
 
         # Suppression des favoris de la liste principale pour éviter les doublons
-        # On crée un ensemble (set) des références favorites pour une recherche O(1)
-        refs_favoris = {p['reference'] for p in produits_favoris}
-        produits = [
-            p for p in produits
-            if p['reference'] not in refs_favoris
-        ]
+        # On crée un ensemble des références favorites pour une recherche O(1)
+        # (aucun parcours de la liste si l'utilisateur n'a pas de favori)
+        refs_favoris = frozenset(p['reference'] for p in produits_favoris)
+        if refs_favoris:
+            produits = [
+                p for p in produits
+                if p['reference'] not in refs_favoris
+            ]
 
     # =========================================================================
     # PAGINATION DES PRODUITS
@@ -147,29 +161,6 @@ def liste_produits(request):
     page_number = request.GET.get('page', 1)
     page_obj = paginator.get_page(page_number)
 
-    # =========================================================================
-    # CALCUL DU RÉCAPITULATIF DU PANIER
-    # =========================================================================
-    # Le panier est stocké en session sous forme de dictionnaire {reference: quantite}
-    panier = request.session.get('panier', {})
-    lignes_panier = []
-    total_panier = 0
-
-    # Construction du détail du panier avec les informations produits actuelles
-    for reference, quantite in panier.items():
-        produit = get_produit_by_reference(utilisateur, reference)
-        if produit:
-            # Calcul du total de la ligne (prix unitaire × quantité)
-            ligne_total = produit['prix'] * quantite
-            lignes_panier.append({
-                'reference': reference,
-                'nom': produit['nom'],
-                'quantite': quantite,
-                'prix': produit['prix'],
-                'total': ligne_total,
-            })
-            total_panier += ligne_total
-
     # Préparation du contexte pour le template
     context = {
         'produits': page_obj,  # Page actuelle des produits
@@ -179,8 +170,6 @@ def liste_produits(request):
         'filtres_groupes': filtres_groupes,
         'filtres_actifs': filtres_actifs,
         'recherche': request.GET.get('q', ''),
-        'lignes_panier': lignes_panier,
-        'total_panier': total_panier,
     }
 
     return render(
@@ -192,6 +181,7 @@ def liste_produits(request):
 
 
 @login_required
+@utilisateur_required
 def favoris(request):
     """
     Affiche la page dédiée aux produits favoris de l'utilisateur.
@@ -215,8 +205,8 @@ def favoris(request):
                 - filtres_groupes: Groupes de filtres disponibles
                 - filtres_actifs: Liste des filtres actuellement appliqués
                 - recherche: Terme de recherche actuel
-                - lignes_panier: Détail des lignes du panier
-                - total_panier: Montant total du panier
+                - lignes_panier, total_panier: fournis par le context processor
+                  catalogue.context_processors.panier_recap
                 - page_title: Titre de la page ('Favoris')
 
     Note:
@@ -224,34 +214,16 @@ def favoris(request):
         des commandes. Un produit qui n'est plus disponible dans le catalogue
         ne sera pas affiché même s'il a été beaucoup commandé.
     """
-    # Vérification du profil utilisateur
-    if not hasattr(request.user, 'utilisateur'):
-        messages.error(request, "Votre compte n'est pas associé à un profil utilisateur. Contactez l'administrateur.")
-        return redirect('clients:connexion')
-    utilisateur = request.user.utilisateur
+    utilisateur = request.utilisateur
 
     # =========================================================================
     # RÉCUPÉRATION DES PRODUITS LES PLUS COMMANDÉS
     # =========================================================================
     # Agrégation des lignes de commande pour obtenir les 12 références
-    # les plus commandées en termes de quantité totale
-    top_references = (
-        LigneCommande.objects
-        .filter(commande__utilisateur=utilisateur)
-        .values('reference_produit')
-        .annotate(total_commande=Sum('quantite'))
-        .order_by('-total_commande')[:12]
-    )
-
+    # les plus commandées en termes de quantité totale (en cache)
     # Enrichissement des données avec les informations complètes du produit
-    # depuis la base de données distante
-    produits_favoris = []
-    for entry in top_references:
-        produit = get_produit_by_reference(utilisateur, entry['reference_produit'])
-        if produit:
-            # Ajout du total commandé pour affichage dans le template
-            produit['total_commande'] = entry['total_commande']
-            produits_favoris.append(produit)
+    # depuis l'index du catalogue du client (partagé avec le panier)
+    produits_favoris = _produits_favoris(utilisateur, get_produits_index(utilisateur), 12)
 
     # =========================================================================
     # APPLICATION DES FILTRES
@@ -267,40 +239,19 @@ def favoris(request):
     # Filtrage de la liste des favoris
     produits_favoris = appliquer_filtres(produits_favoris, filtres_actifs, recherche)
 
-    # =========================================================================
-    # RÉCAPITULATIF DU PANIER
-    # =========================================================================
-    # Construction identique à la vue liste_produits
-    panier = request.session.get('panier', {})
-    lignes_panier = []
-    total_panier = 0
-    for reference, quantite in panier.items():
-        produit = get_produit_by_reference(utilisateur, reference)
-        if produit:
-            ligne_total = produit['prix'] * quantite
-            lignes_panier.append({
-                'reference': reference,
-                'nom': produit['nom'],
-                'quantite': quantite,
-                'prix': produit['prix'],
-                'total': ligne_total,
-            })
-            total_panier += ligne_total
-
     # Préparation du contexte pour le template
     context = {
         'produits_favoris': produits_favoris,
         'filtres_groupes': filtres_groupes,
         'filtres_actifs': filtres_actifs,
         'recherche': request.GET.get('q', ''),
-        'lignes_panier': lignes_panier,
-        'total_panier': total_panier,
         'page_title': 'Favoris',
     }
     return render(request, 'cote_client/catalogue/favoris.html', context)
 
 
 @login_required
+@utilisateur_required
 def detail_produit(request, reference):
     """
     Affiche la page de détail d'un produit spécifique.
@@ -329,12 +280,7 @@ def detail_produit(request, reference):
         La fonction get_produit_by_reference vérifie automatiquement que
         le produit fait partie du catalogue accessible à l'utilisateur.
     """
-    # Vérification du profil utilisateur
-    if not hasattr(request.user, 'utilisateur'):
-        messages.error(request, "Votre compte n'est pas associé à un profil utilisateur.")
-        return redirect('clients:connexion')
-
-    utilisateur = request.user.utilisateur
+    utilisateur = request.utilisateur
 
     # Récupération du produit par sa référence
     # La fonction retourne None si le produit n'existe pas ou n'est pas accessible
@@ -372,6 +318,7 @@ def mentions_legales(request):
 
 
 @login_required
+@utilisateur_required
 def commander(request):
     """
     Gère le formulaire de commande et la création de nouvelles commandes.
@@ -419,44 +366,32 @@ def commander(request):
         - Le panier est automatiquement vidé après une commande réussie
         - Les prix sont convertis en Decimal pour une précision comptable
     """
-    # Récupération des informations utilisateur et client
-    utilisateur = request.user.utilisateur
-
-    # Récupération des informations client depuis la base distante (ERP)
-    # Ces informations sont nécessaires pour la génération du fichier EDI
-    client_distant = get_client_distant(utilisateur.code_tiers)
-
-    # Récupération de la liste complète des produits du client
-    produits = get_produits_client(utilisateur)
-
-    # =========================================================================
-    # PRÉPARATION DES FILTRES
-    # =========================================================================
-    produits, filtres_groupes, _ = preparer_filtres(produits, seuil_occurrences=3)
-
-    # Récupération des paramètres de filtrage depuis l'URL (GET)
-    filtres_actifs = request.GET.getlist("filtre")
-    recherche = request.GET.get('q', '').strip()
-
-    # Application des filtres et de la recherche
-    produits = appliquer_filtres(produits, filtres_actifs, recherche)
+    # Objet utilisateur métier (lié au User Django), vérifié par le décorateur
+    utilisateur = request.utilisateur
 
     # =========================================================================
     # TRAITEMENT DU FORMULAIRE DE COMMANDE (POST)
     # =========================================================================
     if request.method == 'POST':
+        # Index {référence: produit} du catalogue du client
+        index = get_produits_index(utilisateur)
+
         # Liste des lignes de commande avec leurs totaux
         lignes = []
         total = 0
 
-        # Parcours de tous les produits pour extraire les quantités commandées
-        for produit in produits:
-            # Le nom du champ de quantité suit le format "qte_{reference}"
-            qte_key = f"qte_{produit['reference']}"
-            quantite = int(request.POST.get(qte_key, 0))
+        # Seuls les champs de quantité soumis sont parcourus (format
+        # "qte_{reference}"), pas tout le catalogue ; les références hors
+        # du catalogue du client sont ignorées
+        for qte_key, valeur in request.POST.items():
+            # isdecimal (et non isdigit) : '²' ou '³' feraient échouer int()
+            if not qte_key.startswith('qte_') or not valeur.isdecimal():
+                continue
+            produit = index.get(qte_key[4:])
+            quantite = int(valeur)
 
             # Ajout à la commande uniquement si quantité positive
-            if quantite > 0:
+            if produit and quantite > 0:
                 ligne_total = produit['prix'] * quantite
                 lignes.append({
                     'reference': produit['reference'],
@@ -470,7 +405,7 @@ def commander(request):
         # Validation: au moins un produit doit être commandé
         if not lignes:
             messages.warning(request, 'Veuillez sélectionner au moins un produit.')
-            return redirect('catalogue:commander')
+            return redirect(_url('catalogue:commander'))
 
         # Récupération des informations complémentaires de la commande
         commentaires = request.POST.get('commentaires', '')
@@ -495,20 +430,33 @@ def commander(request):
         request.session.modified = True
 
         # Redirection vers la page récapitulatif
-        return redirect('commandes:valider')
+        return redirect(_url('commandes:valider'))
 
     # =========================================================================
     # AFFICHAGE DU FORMULAIRE DE COMMANDE (GET)
     # =========================================================================
-    # Pré-remplissage des quantités avec le contenu du panier en session
+    # Récupération des informations client depuis la base distante (ERP)
+    client_distant = get_client_distant(utilisateur.code_tiers)
+
+    # Liste complète des produits du client, tagués (en cache par client)
+    produits, filtres_groupes, index_tags = preparer_filtres_client(utilisateur, seuil_occurrences=3)
+
+    # Récupération des paramètres de filtrage depuis l'URL (GET)
+    filtres_actifs = request.GET.getlist("filtre")
+    recherche = request.GET.get('q', '').strip()
+
+    # Application des filtres et de la recherche
+    produits = appliquer_filtres(produits, filtres_actifs, recherche, index_tags)
+
+    # Pré-remplissage des quantités avec le contenu du panier en session :
+    # le template lit la quantité par référence, les produits ne sont pas modifiés
     panier = request.session.get('panier', {})
-    for produit in produits:
-        # Ajout de la quantité du panier à chaque produit pour pré-remplir le formulaire
-        produit['panier_qte'] = panier.get(produit['reference'], 0)
+    panier_map = {ref: int(qte) for ref, qte in panier.items()}
 
     context = {
         'client': client_distant,
         'produits': produits,
+        'panier_map': panier_map,
         'filtres_groupes': filtres_groupes,
         'filtres_actifs': filtres_actifs,
         'recherche': recherche,
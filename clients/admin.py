@@ -13,6 +13,8 @@ class UtilisateurInline(admin.StackedInline):
 class UserAdmin(BaseUserAdmin):
     inlines = (UtilisateurInline,)
     list_display = ('username', 'get_code_tiers', 'is_active')
+    # Profil chargé par jointure : pas de requête par ligne pour get_code_tiers
+    list_select_related = ('utilisateur',)
 
     def get_code_tiers(self, obj):
         if hasattr(obj, 'utilisateur'):
@@ -28,4 +30,5 @@ admin.site.register(User, UserAdmin)
 @admin.register(Utilisateur)
 class UtilisateurAdmin(admin.ModelAdmin):
     list_display = ('code_tiers', 'user')
+    list_select_related = ('user',)
     search_fields = ('code_tiers', 'user__username')
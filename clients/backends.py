@@ -0,0 +1,31 @@
+"""
+=============================================================================
+BACKENDS.PY - Backend d'authentification de l'application Clients
+=============================================================================
+
+Backend basé sur ModelBackend qui charge le profil Utilisateur avec le
+User Django à chaque requête authentifiée.
+
+Projet : Extranet Giffaud Groupe
+=============================================================================
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class UtilisateurBackend(ModelBackend):
+    """
+    Authentification standard, avec le profil Utilisateur joint au User.
+
+    Les vues client accèdent à request.user.utilisateur sur chaque page :
+    le charger par jointure lors de la récupération du User économise une
+    requête par page.
+    """
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('utilisateur').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,55 @@
+"""
+=============================================================================
+DECORATORS.PY - Décorateurs de l'application Clients
+=============================================================================
+
+Décorateurs disponibles :
+    - @utilisateur_required : Restreint une vue aux comptes ayant un
+      profil Utilisateur (code tiers) associé
+
+Utilisation :
+    from clients.decorators import utilisateur_required
+
+    @login_required
+    @utilisateur_required
+    def ma_vue(request):
+        utilisateur = request.utilisateur
+        ...
+
+Projet : Extranet Giffaud Groupe
+=============================================================================
+"""
+from functools import wraps
+
+from django.contrib import messages
+from django.shortcuts import redirect
+
+
+def utilisateur_required(view_func):
+    """
+    Décorateur qui exige un profil Utilisateur associé au compte connecté.
+
+    Sans profil, l'utilisateur est redirigé vers la page de connexion avec
+    un message d'erreur. Sinon, le profil est placé dans request.utilisateur
+    pour la vue.
+
+    À placer sous @login_required.
+
+    Args:
+        view_func: La fonction de vue à protéger
+
+    Returns:
+        function: La vue décorée
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        utilisateur = getattr(request.user, 'utilisateur', None)
+        if utilisateur is None:
+            messages.error(
+                request,
+                "Votre compte n'est pas associé à un profil utilisateur. Contactez l'administrateur."
+            )
+            return redirect('clients:connexion')
+        request.utilisateur = utilisateur
+        return view_func(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-16 11:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0006_remove_demandemotdepasse'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historiquesuppressionutilisateur',
+            index=models.Index(fields=['date_suppression_definitive'], name='histsupputil_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tokenresetpassword',
+            index=models.Index(fields=['user', 'utilise'], name='token_user_utilise_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tokenresetpassword',
+            index=models.Index(fields=['date_creation'], name='token_date_creation_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='utilisateursupprime',
+            index=models.Index(fields=['date_suppression'], name='utilsupp_date_idx'),
+        ),
+    ]
@@ -23,7 +23,7 @@ Dépendances:
 ==============================================================================
 """
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
@@ -86,22 +86,18 @@ class Utilisateur(models.Model):
         """
         Récupère les informations du client depuis la base de données distante.
 
-        Cette méthode exécute une requête SQL directe sur la base 'logigvd'
-        pour récupérer les informations du client associé au code_tiers.
-        Elle privilégie les entrées sans complément d'adresse pour obtenir
-        l'adresse principale du client.
-
-        La requête utilise un ORDER BY pour garantir des résultats cohérents
-        et déterministes en cas de doublons.
+        Délègue à catalogue.services.get_client_distant : même adresse
+        (l'adresse principale, sans complément, en priorité), même objet
+        et même cache par code tiers que le catalogue et l'EDI.
 
         Returns:
-            SimpleNamespace: Objet avec les attributs nom, complement,
+            SimpleNamespace: Objet avec les attributs tiers, nom, complement,
                 adresse, cp, acheminement. Retourne None si aucun client
                 n'est trouvé pour ce code_tiers.
 
         Note:
-            Utilise une connexion directe via Django's database routing
-            vers la base 'logigvd'.
+            Le résultat est mémorisé sur l'instance : plusieurs appels dans
+            une même page (vue puis template) ne relisent pas le cache.
 
         Example:
             >>> client = utilisateur.get_client_distant()
@@ -109,38 +105,39 @@ class Utilisateur(models.Model):
             ...     print(f"{client.nom}, {client.cp} {client.acheminement}")
             'ENTREPRISE DUPONT, 44000 NANTES'
         """
-        from django.db import connections
-        from types import SimpleNamespace
-
-        with connections['logigvd'].cursor() as cursor:
-            # Première requête: chercher une entrée avec complement vide
-            # (adresse principale du client)
-            cursor.execute("""
-                SELECT nom, complement, adresse, cp, acheminement FROM comcli
-                WHERE tiers = %s AND (complement IS NULL OR TRIM(complement) = '')
-                ORDER BY nom
-                LIMIT 1
-            """, [self.code_tiers])
-            row = cursor.fetchone()
-
-            # Si aucune entrée sans complément, prendre la première entrée disponible
-            if not row:
-                cursor.execute("""
-                    SELECT nom, complement, adresse, cp, acheminement FROM comcli
-                    WHERE tiers = %s ORDER BY complement, nom LIMIT 1
-                """, [self.code_tiers])
-                row = cursor.fetchone()
-
-        # Construire et retourner l'objet SimpleNamespace avec les données
-        if row:
-            return SimpleNamespace(
-                nom=row[0],
-                complement=row[1],
-                adresse=row[2],
-                cp=row[3],
-                acheminement=row[4]
-            )
-        return None
+        from catalogue.services import get_client_distant
+
+        if not hasattr(self, '_client_distant'):
+            self._client_distant = get_client_distant(self.code_tiers)
+        return self._client_distant
+
+    @classmethod
+    def precharger_clients_distants(cls, utilisateurs):
+        """
+        Charge en une fois les informations distantes de plusieurs utilisateurs.
+
+        À appeler avant une boucle sur get_client_distant (listes de
+        l'administration) : les clients absents du cache sont lus en une
+        seule requête sur la base distante au lieu d'une requête par
+        ligne (voir catalogue.services.get_clients_distants), puis
+        mémorisés sur chaque instance.
+
+        Un code tiers introuvable n'est pas mémorisé ici : il sera résolu
+        (et mis en cache) par get_client_distant comme avant.
+
+        Args:
+            utilisateurs (iterable): Instances Utilisateur
+        """
+        from catalogue.services import get_clients_distants
+
+        a_charger = [u for u in utilisateurs if not hasattr(u, '_client_distant')]
+        if not a_charger:
+            return
+
+        clients = get_clients_distants(dict.fromkeys(u.code_tiers for u in a_charger))
+        for utilisateur in a_charger:
+            if utilisateur.code_tiers in clients:
+                utilisateur._client_distant = clients[utilisateur.code_tiers]
 
 
 class TokenResetPassword(models.Model):
@@ -194,6 +191,12 @@ class TokenResetPassword(models.Model):
         verbose_name = 'Token de réinitialisation'
         verbose_name_plural = 'Tokens de réinitialisation'
         ordering = ['-date_creation']
+        indexes = [
+            # Invalidation des anciens tokens d'un compte (generer_token)
+            models.Index(fields=['user', 'utilise'], name='token_user_utilise_idx'),
+            # Purge des tokens de plus de 24 heures (nettoyer_anciens)
+            models.Index(fields=['date_creation'], name='token_date_creation_idx'),
+        ]
 
     def __str__(self):
         """
@@ -333,6 +336,10 @@ class HistoriqueSuppressionUtilisateur(models.Model):
         verbose_name = 'Historique de suppression utilisateur'
         verbose_name_plural = 'Historiques de suppression utilisateurs'
         ordering = ['-date_suppression_definitive']
+        indexes = [
+            # Suppressions des dernières 24 heures (tableau de bord)
+            models.Index(fields=['date_suppression_definitive'], name='histsupputil_date_idx'),
+        ]
 
     def __str__(self):
         """
@@ -407,6 +414,10 @@ class UtilisateurSupprime(models.Model):
         verbose_name = 'Utilisateur supprimé'
         verbose_name_plural = 'Utilisateurs supprimés'
         ordering = ['-date_suppression']
+        indexes = [
+            # Utilisateurs dont le délai de restauration est écoulé (nettoyer_anciens)
+            models.Index(fields=['date_suppression'], name='utilsupp_date_idx'),
+        ]
 
     def __str__(self):
         """
@@ -474,10 +485,10 @@ class UtilisateurSupprime(models.Model):
 
         Processus:
             1. Identifier les utilisateurs supprimés depuis plus de 5 min
-            2. Pour chaque utilisateur:
-                a. Créer une entrée dans HistoriqueSuppressionUtilisateur
-                b. Supprimer les fichiers EDI (CSV) associés aux commandes
-            3. Supprimer les enregistrements UtilisateurSupprime
+            2. En une transaction : créer les entrées de
+               HistoriqueSuppressionUtilisateur (INSERT groupé) et supprimer
+               les enregistrements UtilisateurSupprime
+            3. Supprimer les fichiers EDI (CSV) associés aux commandes
 
         Note:
             Les fichiers EDI sont stockés dans le répertoire
@@ -487,7 +498,6 @@ class UtilisateurSupprime(models.Model):
             >>> # Appelé périodiquement par une tâche planifiée
             >>> UtilisateurSupprime.nettoyer_anciens()
         """
-        import os
         from pathlib import Path
 
         # Chemin vers le répertoire des exports EDI
@@ -499,28 +509,50 @@ class UtilisateurSupprime(models.Model):
         # Récupérer tous les utilisateurs supprimés depuis plus de 5 minutes
         anciens = cls.objects.filter(date_suppression__lt=limite)
 
-        for utilisateur in anciens:
-            # Créer l'entrée dans l'historique pour traçabilité
-            nb_commandes = len(utilisateur.commandes_json)
-            HistoriqueSuppressionUtilisateur.objects.create(
+        ids_traites = []
+        historiques = []
+        fichiers_edi = []
+        # Lecture par lots des seules colonnes utiles (commandes_json peut être
+        # volumineux) : les instances ne sont pas toutes gardées en mémoire
+        for utilisateur in (
+            anciens.order_by()
+            .only('username', 'nom_client', 'code_tiers', 'commandes_json')
+            .iterator(chunk_size=200)
+        ):
+            ids_traites.append(utilisateur.pk)
+
+            # Entrée d'historique pour traçabilité
+            historiques.append(HistoriqueSuppressionUtilisateur(
                 username=utilisateur.username,
                 nom_client=utilisateur.nom_client,
                 code_tiers=utilisateur.code_tiers,
-                nb_commandes=nb_commandes,
-            )
+                nb_commandes=len(utilisateur.commandes_json),
+            ))
 
-            # Supprimer les fichiers CSV EDI associés aux commandes
+            # Fichiers CSV EDI associés aux commandes
             # Ces fichiers contiennent les données de commande au format EDI
-            for commande in utilisateur.commandes_json:
-                numero = commande.get('numero', '')
-                if numero:
-                    fichier_edi = EDI_OUTPUT_DIR / f"{numero}.csv"
-                    if fichier_edi.exists():
-                        try:
-                            os.remove(fichier_edi)
-                        except OSError:
-                            # En cas d'erreur (fichier verrouillé, etc.), continuer
-                            pass
-
-        # Supprimer tous les enregistrements UtilisateurSupprime traités
-        anciens.delete()
+            fichiers_edi.extend(
+                EDI_OUTPUT_DIR / f"{commande['numero']}.csv"
+                for commande in utilisateur.commandes_json
+                if commande.get('numero')
+            )
+
+        if not ids_traites:
+            return
+
+        # Historiques créés et enregistrements supprimés ensemble, en une
+        # transaction (un INSERT groupé au lieu d'un par utilisateur)
+        with transaction.atomic():
+            HistoriqueSuppressionUtilisateur.objects.bulk_create(historiques, batch_size=500)
+            cls.objects.filter(pk__in=ids_traites).delete()
+
+        # Suppression des fichiers après la transaction : les accès disque
+        # (dossier réseau) ne prolongent pas le verrou sur la base.
+        # Un seul appel système par fichier : un fichier absent est ignoré
+        # (le dossier, partagé par toutes les commandes, n'est pas parcouru)
+        for fichier_edi in fichiers_edi:
+            try:
+                fichier_edi.unlink(missing_ok=True)
+            except OSError:
+                # En cas d'erreur (fichier verrouillé, etc.), continuer
+                pass
@@ -9,15 +9,20 @@ Tests couverts :
     - Vues : connexion, deconnexion, profil, modifier_mot_de_passe,
              modifier_email, reset_password_confirm
     - Formulaire : ConnexionForm
+    - Authentification : UtilisateurBackend, utilisateur_required
+    - Admin Django : liste des utilisateurs sans requête par ligne
 
 Projet : Extranet Giffaud Groupe
 =============================================================================
 """
 from datetime import timedelta
 from types import SimpleNamespace
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils import timezone
@@ -28,6 +33,9 @@ from .models import (
     UtilisateurSupprime,
     HistoriqueSuppressionUtilisateur,
 )
+from .backends import UtilisateurBackend
+from catalogue.models import ComCli
+from catalogue.services import get_client_distant
 from .forms import ConnexionForm
 
 
@@ -79,6 +87,68 @@ class UtilisateurModelTest(TestCase):
         user, utilisateur = creer_utilisateur()
         self.assertEqual(user.utilisateur, utilisateur)
 
+    @patch('catalogue.services._adresses_clients')
+    def test_get_client_distant_adresse_principale(self, mock_adresses):
+        cache.clear()
+        _, utilisateur = creer_utilisateur(code_tiers='1')
+        mock_adresses.return_value.first.return_value = ComCli(
+            tiers=1, nom='CLIENT TEST', complement='', adresse='1 rue Test',
+            cp='44000', acheminement='NANTES',
+        )
+        client = utilisateur.get_client_distant()
+        mock_adresses.assert_called_once_with(['1'])
+        self.assertEqual(client.nom, 'CLIENT TEST')
+        self.assertEqual(client.acheminement, 'NANTES')
+
+    @patch('catalogue.services._adresses_clients')
+    def test_get_client_distant_memorise(self, mock_adresses):
+        cache.clear()
+        _, utilisateur = creer_utilisateur(code_tiers='1')
+        mock_adresses.return_value.first.return_value = None
+        self.assertIsNone(utilisateur.get_client_distant())
+        self.assertIsNone(utilisateur.get_client_distant())
+        # Autre instance du même client : lu depuis le cache
+        self.assertIsNone(Utilisateur.objects.get(pk=utilisateur.pk).get_client_distant())
+        self.assertEqual(mock_adresses.call_count, 1)
+
+    @patch('catalogue.services._adresses_clients')
+    def test_get_client_distant_partage_avec_catalogue(self, mock_adresses):
+        cache.clear()
+        _, utilisateur = creer_utilisateur(code_tiers='1')
+        mock_adresses.return_value.first.return_value = ComCli(
+            tiers=1, nom='CLIENT TEST', complement='', adresse='1 rue Test',
+            cp='44000', acheminement='NANTES',
+        )
+        # Même objet que le catalogue et l'EDI, sans nouvelle requête
+        self.assertEqual(utilisateur.get_client_distant(), get_client_distant('1'))
+        self.assertEqual(utilisateur.get_client_distant().tiers, 1)
+        self.assertEqual(mock_adresses.call_count, 1)
+
+    @patch('catalogue.services._adresses_clients')
+    def test_precharger_clients_distants(self, mock_adresses):
+        cache.clear()
+        _, u1 = creer_utilisateur(code_tiers='1')
+        _, u2 = creer_utilisateur(username='client2', code_tiers='2')
+        _, u3 = creer_utilisateur(username='client3', code_tiers='3')
+        mock_adresses.return_value = [
+            ComCli(tiers=1, nom='CLIENT UN', complement='', adresse='1 rue A'),
+            ComCli(tiers=1, nom='CLIENT UN', complement='Quai 2', adresse='2 rue A'),
+            ComCli(tiers=2, nom='CLIENT DEUX', complement='Quai 1', adresse='1 rue B'),
+        ]
+        Utilisateur.precharger_clients_distants([u1, u2, u3])
+        mock_adresses.assert_called_once_with(['1', '2', '3'])
+        self.assertEqual(u1.get_client_distant().adresse, '1 rue A')
+        self.assertEqual(u2.get_client_distant().nom, 'CLIENT DEUX')
+        self.assertEqual(mock_adresses.call_count, 1)
+        # Code tiers introuvable : résolu individuellement par get_client_distant
+        mock_adresses.return_value = MagicMock()
+        mock_adresses.return_value.first.return_value = None
+        self.assertIsNone(u3.get_client_distant())
+        self.assertEqual(mock_adresses.call_count, 2)
+        # Déjà en cache : aucune nouvelle requête
+        Utilisateur.precharger_clients_distants(Utilisateur.objects.filter(code_tiers__in=['1', '2']))
+        self.assertEqual(mock_adresses.call_count, 2)
+
 
 class TokenResetPasswordModelTest(TestCase):
     """Tests du modele TokenResetPassword."""
@@ -189,6 +259,32 @@ class UtilisateurSupprimeModelTest(TestCase):
         self.assertEqual(UtilisateurSupprime.objects.count(), 0)
         self.assertEqual(HistoriqueSuppressionUtilisateur.objects.count(), 1)
 
+    def test_nettoyer_anciens_historiques_groupes(self):
+        for i in range(3):
+            self._creer_utilisateur_supprime(username=f'supprime{i}')
+        UtilisateurSupprime.objects.update(date_suppression=timezone.now() - timedelta(minutes=6))
+        # SELECT, puis transaction (savepoint en test) : un INSERT groupé et un DELETE
+        with self.assertNumQueries(5):
+            UtilisateurSupprime.nettoyer_anciens()
+        self.assertEqual(
+            set(HistoriqueSuppressionUtilisateur.objects.values_list('username', flat=True)),
+            {'supprime0', 'supprime1', 'supprime2'},
+        )
+        self.assertIsNotNone(HistoriqueSuppressionUtilisateur.objects.first().date_suppression_definitive)
+
+    @patch('pathlib.Path.unlink')
+    def test_nettoyer_anciens_supprime_fichiers_edi(self, mock_unlink):
+        us = self._creer_utilisateur_supprime(
+            commandes_json=[{'numero': 'CMD-1'}, {'numero': ''}, {'numero': 'CMD-2'}]
+        )
+        UtilisateurSupprime.objects.filter(pk=us.pk).update(
+            date_suppression=timezone.now() - timedelta(minutes=6)
+        )
+        UtilisateurSupprime.nettoyer_anciens()
+        # Un appel par fichier, sans test d'existence préalable
+        self.assertEqual(mock_unlink.call_count, 2)
+        mock_unlink.assert_called_with(missing_ok=True)
+
     def test_nettoyer_anciens_garde_recents(self):
         self._creer_utilisateur_supprime()
         UtilisateurSupprime.nettoyer_anciens()
@@ -386,6 +482,12 @@ class ResetPasswordConfirmViewTest(TestCase):
         )
         self.assertEqual(response.status_code, 302)
 
+    def test_token_verifie_en_une_requete(self):
+        # Token et compte chargés ensemble ; aucune requête de diagnostic si absent
+        for token in (self.token_obj.token, 'tokeninvalide123'):
+            with self.assertNumQueries(1):
+                self.client.get(reverse('clients:reset_password_confirm', args=[token]))
+
     def test_reset_password_succes(self):
         response = self.client.post(
             reverse('clients:reset_password_confirm', args=[self.token_obj.token]),
@@ -426,3 +528,59 @@ class ResetPasswordConfirmViewTest(TestCase):
             reverse('clients:reset_password_confirm', args=[self.token_obj.token])
         )
         self.assertEqual(response.status_code, 302)
+
+
+# =============================================================================
+# TESTS DE L'AUTHENTIFICATION
+# =============================================================================
+
+class UtilisateurBackendTest(TestCase):
+    """Tests du backend qui charge le profil avec le User."""
+
+    def test_profil_charge_avec_le_user(self):
+        user, utilisateur = creer_utilisateur()
+        with self.assertNumQueries(1):
+            charge = UtilisateurBackend().get_user(user.pk)
+            self.assertEqual(charge.utilisateur, utilisateur)
+
+    def test_user_inexistant(self):
+        self.assertIsNone(UtilisateurBackend().get_user(9999))
+
+
+class UtilisateurRequiredTest(TestCase):
+    """Tests : une vue client exige un profil utilisateur."""
+
+    def test_sans_profil_redirige(self):
+        User.objects.create_user(username='sansprofil', password='testpass1234')
+        self.client.login(username='sansprofil', password='testpass1234')
+        response = self.client.get(reverse('catalogue:favoris'))
+        self.assertRedirects(response, reverse('clients:connexion'), fetch_redirect_response=False)
+
+    def test_commander_sans_profil_redirige(self):
+        User.objects.create_user(username='sansprofil', password='testpass1234')
+        self.client.login(username='sansprofil', password='testpass1234')
+        response = self.client.get(reverse('catalogue:commander'))
+        self.assertRedirects(response, reverse('clients:connexion'), fetch_redirect_response=False)
+
+
+# =============================================================================
+# TESTS DE L'ADMIN DJANGO
+# =============================================================================
+
+class UserAdminTest(TestCase):
+    """Tests de la liste des utilisateurs dans l'admin Django."""
+
+    def _nb_requetes_liste(self):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('admin:auth_user_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(requetes)
+
+    def test_code_tiers_sans_requete_par_ligne(self):
+        User.objects.create_superuser(username='super', password='superpass1234')
+        self.client.login(username='super', password='superpass1234')
+        creer_utilisateur()
+        nb_requetes = self._nb_requetes_liste()
+        creer_utilisateur(username='client2', code_tiers='CLI002')
+        creer_utilisateur(username='client3', code_tiers='CLI003')
+        self.assertEqual(self._nb_requetes_liste(), nb_requetes)
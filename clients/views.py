@@ -444,26 +444,15 @@ def reset_password_confirm(request, token):
     Sécurité :
         - Le token est marqué comme utilisé après un changement réussi
         - Les tokens expirés ou invalides sont rejetés
-        - Les messages de debug sont présents pour le développement
     """
-    # Debug : affichage du token reçu
-    print(f"[RESET MDP] Token reçu: {token}")
-    print(f"[RESET MDP] Longueur token: {len(token)}")
-
     # =========================================================================
     # VÉRIFICATION DU TOKEN
     # =========================================================================
+    # Le compte est chargé avec le token (une seule requête) : il sert au
+    # changement de mot de passe
     try:
-        token_obj = TokenResetPassword.objects.get(token=token)
-        print(f"[RESET MDP] Token trouvé pour: {token_obj.user.username}")
+        token_obj = TokenResetPassword.objects.select_related('user').get(token=token)
     except TokenResetPassword.DoesNotExist:
-        # Debug : lister les tokens existants pour diagnostic
-        tokens_existants = TokenResetPassword.objects.filter(
-            utilise=False
-        ).values_list('token', flat=True)[:5]
-        print(f"[RESET MDP] Token NON trouvé: {token}")
-        print(f"[RESET MDP] Tokens existants (5 premiers): {list(tokens_existants)}")
-
         messages.error(request, "Le lien de réinitialisation est invalide.")
         return redirect('clients:connexion')
 
@@ -500,7 +489,7 @@ def reset_password_confirm(request, token):
 
             # Invalidation du token (usage unique)
             token_obj.utilise = True
-            token_obj.save()
+            token_obj.save(update_fields=['utilise'])
 
             messages.success(
                 request,
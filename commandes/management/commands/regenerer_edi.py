@@ -0,0 +1,23 @@
+"""
+Commande de gestion : reprise des fichiers EDI non générés.
+
+Génère le fichier CSV EDI des commandes qui n'en ont pas encore
+(date_generation_edi vide) : génération en arrière-plan interrompue ou
+en échec. Les commandes déjà prises en charge par un autre processus sont
+ignorées. À planifier en cron, par exemple toutes les 10 minutes :
+
+    */10 * * * * python manage.py regenerer_edi
+"""
+from django.core.management.base import BaseCommand
+
+from commandes.tasks import regenerer_edi_en_attente
+
+
+class Command(BaseCommand):
+    help = "Régénère les fichiers EDI des commandes encore en attente"
+
+    def handle(self, *args, **options):
+        generes, echecs = regenerer_edi_en_attente()
+        self.stdout.write(f"{generes} fichier(s) EDI généré(s), {echecs} échec(s)")
+        if echecs:
+            self.stderr.write("Les commandes en échec seront reprises au prochain passage")
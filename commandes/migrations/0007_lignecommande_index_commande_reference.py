@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-16 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commandes', '0006_historiquesuppression'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lignecommande',
+            index=models.Index(fields=['commande', 'reference_produit'], name='lignecmd_cmd_ref_idx'),
+        ),
+    ]
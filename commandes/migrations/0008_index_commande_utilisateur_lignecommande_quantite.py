@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-16 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commandes', '0007_lignecommande_index_commande_reference'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='lignecommande',
+            name='lignecmd_cmd_ref_idx',
+        ),
+        migrations.AddIndex(
+            model_name='lignecommande',
+            index=models.Index(fields=['commande', 'reference_produit', 'quantite'], name='lignecmd_cmd_ref_qte_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commande',
+            index=models.Index(fields=['utilisateur', '-date_commande'], name='commande_util_date_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-16 11:00
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def marquer_commandes_existantes(apps, schema_editor):
+    """Les commandes antérieures ont déjà eu leur EDI : ne pas les régénérer."""
+    Commande = apps.get_model('commandes', 'Commande')
+    Commande.objects.filter(date_generation_edi__isnull=True).update(
+        date_generation_edi=F('date_commande')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commandes', '0008_index_commande_utilisateur_lignecommande_quantite'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='commande',
+            name='date_generation_edi',
+            field=models.DateTimeField(blank=True, help_text="Date et heure d'écriture du fichier CSV EDI pour l'ERP", null=True, verbose_name='Date de génération EDI'),
+        ),
+        migrations.RunPython(marquer_commandes_existantes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-16 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commandes', '0009_commande_date_generation_edi'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='commande',
+            name='debut_generation_edi',
+            field=models.DateTimeField(blank=True, help_text="Date et heure de prise en charge de l'écriture du fichier CSV EDI", null=True, verbose_name='Début de génération EDI'),
+        ),
+    ]
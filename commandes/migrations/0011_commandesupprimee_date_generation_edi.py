@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-16 13:00
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def marquer_archives_existantes(apps, schema_editor):
+    """Les commandes déjà en corbeille sont restaurées comme avant : EDI considéré comme envoyé."""
+    CommandeSupprimee = apps.get_model('commandes', 'CommandeSupprimee')
+    CommandeSupprimee.objects.filter(date_generation_edi__isnull=True).update(
+        date_generation_edi=F('date_commande')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commandes', '0010_commande_debut_generation_edi'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='commandesupprimee',
+            name='date_generation_edi',
+            field=models.DateTimeField(blank=True, help_text="Date d'écriture du fichier CSV EDI de la commande originale", null=True, verbose_name='Date de génération EDI'),
+        ),
+        migrations.RunPython(marquer_archives_existantes, migrations.RunPython.noop),
+    ]
@@ -343,6 +343,14 @@ class CommandeSupprimee(models.Model):
         help_text="Notes ou instructions spéciales du client"
     )
 
+    # Date de génération EDI de la commande originale (vide = EDI jamais écrit)
+    date_generation_edi = models.DateTimeField(
+        verbose_name='Date de génération EDI',
+        blank=True,
+        null=True,
+        help_text="Date d'écriture du fichier CSV EDI de la commande originale"
+    )
+
     # --------------------------------------------------------------------------
     # Sauvegarde des lignes de commande
     # --------------------------------------------------------------------------
@@ -680,6 +688,22 @@ class Commande(models.Model):
         help_text="Date de départ prévu des camions"
     )
 
+    # Date de génération du fichier EDI (vide tant que le CSV n'est pas écrit)
+    date_generation_edi = models.DateTimeField(
+        verbose_name='Date de génération EDI',
+        blank=True,
+        null=True,                  # Vide = EDI à régénérer
+        help_text="Date et heure d'écriture du fichier CSV EDI pour l'ERP"
+    )
+
+    # Prise en charge de la génération EDI (évite d'écrire deux fois le CSV)
+    debut_generation_edi = models.DateTimeField(
+        verbose_name='Début de génération EDI',
+        blank=True,
+        null=True,                  # Vide = génération non prise en charge
+        help_text="Date et heure de prise en charge de l'écriture du fichier CSV EDI"
+    )
+
     # --------------------------------------------------------------------------
     # Montant et commentaires
     # --------------------------------------------------------------------------
@@ -715,6 +739,11 @@ class Commande(models.Model):
         # Tri par défaut: plus récentes en premier
         ordering = ['-date_commande']
 
+        # Commandes d'un utilisateur, déjà triées (historique, favoris)
+        indexes = [
+            models.Index(fields=['utilisateur', '-date_commande'], name='commande_util_date_idx'),
+        ]
+
     # ==========================================================================
     # MÉTHODES SPÉCIALES
     # ==========================================================================
@@ -927,6 +956,15 @@ class LigneCommande(models.Model):
         verbose_name = 'Ligne de commande'
         verbose_name_plural = 'Lignes de commande'
 
+        # Index couvrant pour l'agrégation des produits favoris : la somme
+        # des quantités par référence se lit dans l'index, sans la table
+        indexes = [
+            models.Index(
+                fields=['commande', 'reference_produit', 'quantite'],
+                name='lignecmd_cmd_ref_qte_idx',
+            ),
+        ]
+
     # ==========================================================================
     # MÉTHODES SPÉCIALES
     # ==========================================================================
@@ -0,0 +1,186 @@
+"""
+=============================================================================
+TASKS.PY - Génération EDI des commandes
+=============================================================================
+
+Ce module écrit hors de la requête HTTP le fichier CSV EDI d'une commande
+validée et assure sa reprise en cas d'échec :
+    - reserver_generation_edi : prend en charge la génération d'une commande
+    - generer_edi_commande : recharge une commande puis écrit son EDI
+    - lancer_generation_edi : génère l'EDI dans un thread après la validation
+      de la transaction, avec nouvelles tentatives espacées en cas d'échec
+    - regenerer_edi_en_attente : reprend les commandes sans EDI
+
+La vue de validation enregistre la commande sans EDI (date_generation_edi
+vide) et rend la main immédiatement. Avant d'écrire le fichier, la
+génération prend en charge la commande par un UPDATE conditionnel sur
+Commande.debut_generation_edi : un thread de validation et un passage de
+la commande de gestion `regenerer_edi` (à planifier en cron) ne peuvent
+donc pas envoyer deux fichiers pour la même commande. Une prise en charge
+plus ancienne que EDI_DELAI_PRISE_EN_CHARGE (processus interrompu) est
+considérée comme abandonnée.
+
+Projet : Extranet Giffaud Groupe
+=============================================================================
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.db import connections, transaction
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+
+from catalogue.services import get_client_distant
+from .models import Commande, LigneCommande
+from .services import generer_csv_edi
+
+logger = logging.getLogger(__name__)
+
+# Durée après laquelle une génération prise en charge mais jamais terminée
+# peut être reprise par un autre processus
+EDI_DELAI_PRISE_EN_CHARGE = timedelta(minutes=15)
+
+# Nombre de tentatives de génération dans le thread lancé après une validation
+EDI_TENTATIVES = 3
+
+# Délai avant la première nouvelle tentative (secondes), doublé à chaque échec
+EDI_DELAI_INITIAL = 2
+
+
+def _commandes_disponibles():
+    """Commandes sans EDI dont la génération n'est pas en cours ailleurs."""
+    limite = timezone.now() - EDI_DELAI_PRISE_EN_CHARGE
+    return Commande.objects.filter(
+        Q(debut_generation_edi__isnull=True) | Q(debut_generation_edi__lt=limite),
+        date_generation_edi__isnull=True,
+    )
+
+
+def reserver_generation_edi(commande_id):
+    """
+    Prend en charge la génération EDI d'une commande.
+
+    Un seul UPDATE conditionnel : parmi plusieurs processus concurrents,
+    un seul obtient la commande.
+
+    Args:
+        commande_id (int): Identifiant de la commande
+
+    Returns:
+        bool: True si l'appelant doit écrire le fichier EDI
+    """
+    return _commandes_disponibles().filter(pk=commande_id).update(
+        debut_generation_edi=timezone.now()
+    ) == 1
+
+
+def generer_edi_commande(commande_id):
+    """
+    Génère le fichier CSV EDI d'une commande prise en charge.
+
+    La commande, son utilisateur et ses lignes sont rechargés en deux
+    requêtes ; les informations client viennent de la base distante.
+    En cas d'échec, la prise en charge est libérée : la commande reste
+    en attente et sera reprise par `regenerer_edi`.
+
+    Args:
+        commande_id (int): Identifiant d'une commande réservée par
+            reserver_generation_edi
+
+    Returns:
+        str: Chemin du fichier CSV généré, ou None en cas d'échec ou si la
+        commande a été supprimée entre-temps
+    """
+    try:
+        commande = (
+            Commande.objects
+            .select_related('utilisateur')
+            .prefetch_related(Prefetch('lignes', queryset=LigneCommande.objects.order_by('id')))
+            .get(pk=commande_id)
+        )
+    except Commande.DoesNotExist:
+        logger.warning("Commande %s supprimée avant la génération de son EDI", commande_id)
+        return None
+    lignes = [
+        {
+            'reference': ligne.reference_produit,
+            'nom': ligne.nom_produit,
+            'quantite': ligne.quantite,
+            'prix': ligne.prix_unitaire,
+            'total': ligne.total_ligne,
+        }
+        for ligne in commande.lignes.all()
+    ]
+
+    try:
+        client_distant = get_client_distant(commande.utilisateur.code_tiers)
+        csv_path = generer_csv_edi(commande, client_distant, lignes)
+    except Exception:
+        logger.exception("Erreur génération EDI pour la commande %s", commande.numero)
+        Commande.objects.filter(pk=commande_id).update(debut_generation_edi=None)
+        return None
+
+    Commande.objects.filter(pk=commande_id).update(date_generation_edi=timezone.now())
+    logger.info("Fichier EDI généré pour la commande %s: %s", commande.numero, csv_path)
+    return csv_path
+
+
+def _executer_generation_edi(commande_id):
+    """
+    Corps du thread de génération EDI lancé après une validation.
+
+    Jusqu'à EDI_TENTATIVES essais espacés d'un délai doublé à chaque
+    échec ; la commande est reprise en charge avant chaque essai.
+    """
+    delai = EDI_DELAI_INITIAL
+    try:
+        for tentative in range(1, EDI_TENTATIVES + 1):
+            if not reserver_generation_edi(commande_id):
+                return
+            if generer_edi_commande(commande_id):
+                return
+            if tentative < EDI_TENTATIVES:
+                time.sleep(delai)
+                delai *= 2
+    finally:
+        # Le thread ouvre ses propres connexions : les fermer en sortant
+        connections.close_all()
+
+
+def lancer_generation_edi(commande_id):
+    """
+    Planifie la génération du fichier EDI en arrière-plan.
+
+    Le thread n'est démarré qu'une fois la transaction courante validée,
+    pour qu'il lise la commande et ses lignes déjà enregistrées.
+
+    Args:
+        commande_id (int): Identifiant de la commande
+    """
+    transaction.on_commit(lambda: threading.Thread(
+        target=_executer_generation_edi, args=(commande_id,), daemon=True
+    ).start())
+
+
+def regenerer_edi_en_attente():
+    """
+    Régénère le fichier EDI de toutes les commandes qui n'en ont pas encore.
+
+    Les commandes dont la génération est déjà en cours dans un autre
+    processus sont ignorées.
+
+    Returns:
+        tuple: (nombre de fichiers générés, nombre d'échecs)
+    """
+    generes = echecs = 0
+    en_attente = _commandes_disponibles().order_by('date_commande').values_list('id', flat=True)
+    for commande_id in list(en_attente):
+        if not reserver_generation_edi(commande_id):
+            continue
+        if generer_edi_commande(commande_id):
+            generes += 1
+        else:
+            echecs += 1
+    return generes, echecs
@@ -6,7 +6,9 @@ TESTS.PY - Tests de l'application Commandes
 Tests couverts :
     - Modeles : Commande, LigneCommande, CommandeSupprimee, HistoriqueSuppression
     - Vues : panier (voir, ajouter, modifier, supprimer, vider),
-             historique, details, confirmation
+             historique, details, confirmation, validation
+    - Taches : generation EDI en arriere-plan, prise en charge unique et
+      reprise des commandes en attente
     - Context processor : panier_count
     - Utilitaires : parse_date, get_panier, save_panier
 
@@ -16,9 +18,11 @@ Projet : Extranet Giffaud Groupe
 from datetime import timedelta
 from datetime import timedelta
 from decimal import Decimal
+from io import StringIO
 from types import SimpleNamespace
 from unittest.mock import patch
 
+from django.core.management import call_command
 from django.test import TestCase, Client, RequestFactory
 from django.contrib.auth.models import User
 from django.contrib.sessions.middleware import SessionMiddleware
@@ -29,6 +33,11 @@ from clients.models import Utilisateur
 from .models import Commande, LigneCommande, CommandeSupprimee, HistoriqueSuppression
 from .views import parse_date, get_panier, save_panier
 from .context_processors import panier_count
+from .tasks import (
+    generer_edi_commande, lancer_generation_edi, regenerer_edi_en_attente,
+    reserver_generation_edi, _executer_generation_edi,
+    EDI_DELAI_PRISE_EN_CHARGE, EDI_TENTATIVES,
+)
 
 MOCK_CLIENT_DISTANT = SimpleNamespace(
     nom='CLIENT TEST', complement='', adresse='1 rue Test',
@@ -97,6 +106,12 @@ class PanierSessionTest(TestCase):
         panier = get_panier(request)
         self.assertEqual(panier, {})
 
+    def test_get_panier_sans_ecriture_session(self):
+        request = _get_request_with_session()
+        request.session.modified = False
+        get_panier(request)
+        self.assertFalse(request.session.modified)
+
     def test_save_et_get_panier(self):
         request = _get_request_with_session()
         save_panier(request, {'PROD001': 3})
@@ -358,9 +373,15 @@ class HistoriqueCommandesViewTest(TestCase):
 
     def test_historique_avec_commandes(self, mock_client):
         creer_commande(self.utilisateur, numero='CMD-20260212-0001')
-        creer_commande(self.utilisateur, numero='CMD-20260212-0002')
+        commande = creer_commande(self.utilisateur, numero='CMD-20260212-0002')
+        LigneCommande.objects.create(
+            commande=commande, reference_produit='P1', nom_produit='Saucisse',
+            quantite=2, prix_unitaire=Decimal('5.00')
+        )
         response = self.client.get(reverse('commandes:historique'))
         self.assertEqual(response.status_code, 200)
+        nb_lignes = {c.numero: c.nb_lignes for c in response.context['commandes']}
+        self.assertEqual(nb_lignes, {'CMD-20260212-0001': 0, 'CMD-20260212-0002': 1})
 
 
 @patch('commandes.views.get_client_distant', return_value=MOCK_CLIENT_DISTANT)
@@ -405,3 +426,148 @@ class ConfirmationCommandeViewTest(TestCase):
     def test_page_confirmation(self):
         response = self.client.get(reverse('commandes:confirmation'))
         self.assertEqual(response.status_code, 200)
+
+
+PRODUITS_PANIER = {
+    'P001': {'reference': 'P001', 'nom': 'Saucisse', 'prix': 5.1, 'unite': 'kg'},
+    'P002': {'reference': 'P002', 'nom': 'Jambon', 'prix': 8.0, 'unite': 'unité'},
+}
+
+
+@patch('commandes.views.lancer_generation_edi')
+@patch('commandes.views.envoyer_commande', return_value={'success': True})
+@patch('commandes.views.get_client_distant', return_value=MOCK_CLIENT_DISTANT)
+@patch('commandes.views.get_produits_by_references',
+       side_effect=lambda utilisateur, references: {
+           ref: PRODUITS_PANIER[ref] for ref in references if ref in PRODUITS_PANIER
+       })
+class ValiderCommandeViewTest(TestCase):
+    """Tests de la confirmation finale d'une commande."""
+
+    def setUp(self):
+        self.user, self.utilisateur = creer_utilisateur()
+        self.client.login(username='client1', password='testpass1234')
+        session = self.client.session
+        session['panier'] = {'P001': 3, 'P002': 2}
+        session['commande_recap'] = {
+            'date_livraison': None, 'date_depart_camions': None, 'commentaires': 'Merci',
+        }
+        session.save()
+
+    def test_creation_commande_et_lignes(self, mock_produit, mock_client, mock_envoi, mock_edi):
+        response = self.client.post(reverse('commandes:valider'), {'confirmer': '1'})
+        self.assertRedirects(response, reverse('commandes:confirmation'))
+
+        commande = Commande.objects.get(utilisateur=self.utilisateur)
+        mock_edi.assert_called_once_with(commande.id)
+        self.assertIsNone(commande.date_generation_edi)
+        self.assertEqual(commande.total_ht, Decimal('31.30'))
+        lignes = {l.reference_produit: l for l in commande.lignes.all()}
+        self.assertEqual(lignes['P001'].total_ligne, Decimal('15.30'))
+        self.assertEqual(lignes['P002'].prix_unitaire, Decimal('8.00'))
+        self.assertEqual(lignes['P002'].total_ligne, Decimal('16.00'))
+
+
+@patch('commandes.tasks.get_client_distant', return_value=MOCK_CLIENT_DISTANT)
+class GenerationEdiTaskTest(TestCase):
+    """Tests de la génération EDI et de la reprise des commandes en attente."""
+
+    def setUp(self):
+        _, self.utilisateur = creer_utilisateur()
+        self.commande = creer_commande(self.utilisateur, total_ht='10.00')
+        LigneCommande.objects.create(
+            commande=self.commande, reference_produit='P001', nom_produit='Saucisse',
+            quantite=2, prix_unitaire=Decimal('5.00')
+        )
+
+    @patch('commandes.tasks.generer_csv_edi', return_value='edi.csv')
+    def test_lignes_rechargees(self, mock_generer, mock_client):
+        self.assertEqual(generer_edi_commande(self.commande.id), 'edi.csv')
+        commande, client, lignes = mock_generer.call_args.args
+        self.assertEqual(commande, self.commande)
+        self.assertEqual(client, MOCK_CLIENT_DISTANT)
+        self.assertEqual(lignes, [{
+            'reference': 'P001', 'nom': 'Saucisse', 'quantite': 2,
+            'prix': Decimal('5.00'), 'total': Decimal('10.00'),
+        }])
+        self.commande.refresh_from_db()
+        self.assertIsNotNone(self.commande.date_generation_edi)
+
+    @patch('commandes.tasks.generer_csv_edi', side_effect=OSError('Dossier indisponible'))
+    def test_echec_laisse_commande_en_attente(self, mock_generer, mock_client):
+        self.assertTrue(reserver_generation_edi(self.commande.id))
+        with self.assertLogs('commandes.tasks', level='ERROR'):
+            self.assertIsNone(generer_edi_commande(self.commande.id))
+        self.commande.refresh_from_db()
+        self.assertIsNone(self.commande.date_generation_edi)
+        self.assertIsNone(self.commande.debut_generation_edi)
+
+    def test_reservation_unique(self, mock_client):
+        self.assertTrue(reserver_generation_edi(self.commande.id))
+        self.assertFalse(reserver_generation_edi(self.commande.id))
+
+    def test_reservation_abandonnee_reprise(self, mock_client):
+        Commande.objects.filter(pk=self.commande.pk).update(
+            debut_generation_edi=timezone.now() - EDI_DELAI_PRISE_EN_CHARGE - timedelta(minutes=1)
+        )
+        self.assertTrue(reserver_generation_edi(self.commande.id))
+
+    @patch('commandes.tasks.generer_csv_edi', return_value='edi.csv')
+    def test_reprise_ignore_generation_en_cours(self, mock_generer, mock_client):
+        self.assertTrue(reserver_generation_edi(self.commande.id))
+        self.assertEqual(regenerer_edi_en_attente(), (0, 0))
+        mock_generer.assert_not_called()
+
+    @patch('commandes.tasks.generer_csv_edi', return_value='edi.csv')
+    def test_reprise_continue_apres_commande_supprimee(self, mock_generer, mock_client):
+        autre = creer_commande(self.utilisateur, numero='CMD-20260212-5678')
+        reserver = reserver_generation_edi
+
+        def reserver_puis_supprimer(commande_id):
+            # La commande est supprimée par un administrateur juste après sa prise en charge
+            reservee = reserver(commande_id)
+            if commande_id == self.commande.id:
+                Commande.objects.filter(pk=commande_id).delete()
+            return reservee
+
+        with patch('commandes.tasks.reserver_generation_edi', side_effect=reserver_puis_supprimer):
+            with self.assertLogs('commandes.tasks', level='WARNING'):
+                self.assertEqual(regenerer_edi_en_attente(), (1, 1))
+        self.assertEqual(mock_generer.call_args.args[0], autre)
+        autre.refresh_from_db()
+        self.assertIsNotNone(autre.date_generation_edi)
+
+    @patch('commandes.tasks.threading.Thread')
+    def test_lancement_apres_validation_transaction(self, mock_thread, mock_client):
+        with self.captureOnCommitCallbacks(execute=True):
+            lancer_generation_edi(self.commande.id)
+            mock_thread.assert_not_called()
+        self.assertEqual(mock_thread.call_args.kwargs['args'], (self.commande.id,))
+        mock_thread.return_value.start.assert_called_once()
+
+    @patch('commandes.tasks.connections')
+    @patch('commandes.tasks.time.sleep')
+    @patch('commandes.tasks.generer_csv_edi', side_effect=OSError('Dossier indisponible'))
+    def test_nouvelles_tentatives(self, mock_generer, mock_sleep, mock_connections, mock_client):
+        with self.assertLogs('commandes.tasks', level='ERROR'):
+            _executer_generation_edi(self.commande.id)
+        self.assertEqual(mock_generer.call_count, EDI_TENTATIVES)
+        self.assertEqual([c.args[0] for c in mock_sleep.call_args_list], [2, 4])
+        self.commande.refresh_from_db()
+        self.assertIsNone(self.commande.debut_generation_edi)
+
+    @patch('commandes.tasks.generer_csv_edi', return_value='edi.csv')
+    def test_reprise_commandes_en_attente(self, mock_generer, mock_client):
+        deja_generee = creer_commande(self.utilisateur, numero='CMD-20260212-5678')
+        Commande.objects.filter(pk=deja_generee.pk).update(date_generation_edi=timezone.now())
+
+        self.assertEqual(regenerer_edi_en_attente(), (1, 0))
+        self.assertEqual(mock_generer.call_args.args[0], self.commande)
+        self.assertFalse(Commande.objects.filter(date_generation_edi__isnull=True).exists())
+
+    @patch('commandes.tasks.generer_csv_edi', side_effect=OSError('Dossier indisponible'))
+    def test_commande_gestion_regenerer_edi(self, mock_generer, mock_client):
+        with self.assertLogs('commandes.tasks', level='ERROR'):
+            call_command('regenerer_edi', stdout=StringIO(), stderr=StringIO())
+        self.commande.refresh_from_db()
+        self.assertIsNone(self.commande.date_generation_edi)
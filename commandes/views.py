@@ -22,6 +22,8 @@ Architecture :
 Projet : Extranet Giffaud Groupe
 =============================================================================
 """
+import logging
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
@@ -29,9 +31,10 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
 from decimal import Decimal
 from datetime import datetime
-import traceback
 
 
 def parse_date(date_str):
@@ -57,10 +60,16 @@ def parse_date(date_str):
         return date_str
 
 
-from catalogue.services import get_produit_by_reference, get_client_distant
-from .services import envoyer_commande, generer_csv_edi
+from catalogue.services import (
+    get_produit_by_reference, get_produits_by_references, get_client_distant,
+    invalider_top_references, recap_panier,
+)
+from .services import envoyer_commande
+from .tasks import lancer_generation_edi
 from .models import Commande, LigneCommande
 
+logger = logging.getLogger(__name__)
+
 
 # =============================================================================
 # FONCTIONS UTILITAIRES POUR LE PANIER
@@ -84,9 +93,9 @@ def get_panier(request):
         >>> panier
         {'PROD001': 2, 'PROD002': 5}
     """
-    if 'panier' not in request.session:
-        request.session['panier'] = {}
-    return request.session['panier']
+    # Lecture seule : un panier absent n'est pas écrit en session, pour ne
+    # pas provoquer de sauvegarde de session sur les pages de consultation
+    return request.session.get('panier') or {}
 
 
 def save_panier(request, panier):
@@ -105,6 +114,42 @@ def save_panier(request, panier):
     request.session.modified = True
 
 
+def construire_lignes_commande(utilisateur, panier):
+    """
+    Construit les lignes d'une commande à partir du panier.
+
+    Les prix sont convertis une seule fois en Decimal : les totaux de ligne
+    et le total de la commande sont calculés en arithmétique décimale
+    exacte, directement enregistrables en base.
+
+    Args:
+        utilisateur: Instance Utilisateur
+        panier (dict): Dictionnaire {reference: quantite}
+
+    Returns:
+        tuple: (lignes, total) où lignes est une liste de dictionnaires
+        (reference, nom, prix, unite, quantite, total) et total un Decimal
+    """
+    produits = get_produits_by_references(utilisateur, panier)
+    lignes = []
+    total = Decimal('0')
+    for reference, quantite in panier.items():
+        produit = produits.get(reference)
+        if produit:
+            prix = Decimal(str(produit['prix']))
+            ligne_total = prix * quantite
+            lignes.append({
+                'reference': reference,
+                'nom': produit['nom'],
+                'prix': prix,
+                'unite': produit.get('unite', ''),
+                'quantite': quantite,
+                'total': ligne_total,
+            })
+            total += ligne_total
+    return lignes, total
+
+
 # =============================================================================
 # VUES DU PANIER
 # =============================================================================
@@ -138,10 +183,12 @@ def voir_panier(request):
     panier = get_panier(request)
 
     # Construction des lignes avec informations produits actuelles
+    # (toutes les références sont résolues en un seul accès au catalogue)
+    produits = get_produits_by_references(utilisateur, panier)
     lignes = []
     total = 0
     for reference, quantite in panier.items():
-        produit = get_produit_by_reference(utilisateur, reference)
+        produit = produits.get(reference)
         if produit:
             ligne_total = produit['prix'] * quantite
             lignes.append({
@@ -236,20 +283,9 @@ def ajouter_au_panier(request):
 
     # Réponse AJAX avec données du panier mises à jour
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        lignes_panier = []
-        total_panier = 0
-        for ref, qte in panier.items():
-            p = get_produit_by_reference(utilisateur, ref)
-            if p:
-                ligne_total = p['prix'] * qte
-                lignes_panier.append({
-                    'reference': ref,
-                    'nom': p['nom'],
-                    'quantite': qte,
-                    'prix': p['prix'],
-                    'total': ligne_total,
-                })
-                total_panier += ligne_total
+        lignes_panier, total_panier = recap_panier(
+            panier, get_produits_by_references(utilisateur, panier)
+        )
 
         return JsonResponse({
             'success': True,
@@ -326,11 +362,7 @@ def modifier_quantite(request):
     # Réponse AJAX avec totaux recalculés
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         # Recalcul du total général du panier
-        total_panier = 0
-        for ref, qte in panier.items():
-            produit = get_produit_by_reference(utilisateur, ref)
-            if produit:
-                total_panier += produit['prix'] * qte
+        _, total_panier = recap_panier(panier, get_produits_by_references(utilisateur, panier))
 
         return JsonResponse({
             'success': True,
@@ -375,27 +407,15 @@ def supprimer_du_panier(request):
     panier = get_panier(request)
     if reference in panier:
         del panier[reference]
-    save_panier(request, panier)
+        save_panier(request, panier)
 
     # Réponse AJAX avec panier mis à jour
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         try:
             utilisateur = request.user.utilisateur
-            total_panier = 0
-            lignes_panier = []
-
-            for ref, qte in panier.items():
-                produit = get_produit_by_reference(utilisateur, ref)
-                if produit:
-                    total_ligne = produit['prix'] * qte
-                    total_panier += total_ligne
-                    lignes_panier.append({
-                        'reference': ref,
-                        'nom': produit['nom'],
-                        'quantite': qte,
-                        'prix': produit['prix'],
-                        'total': total_ligne,
-                    })
+            lignes_panier, total_panier = recap_panier(
+                panier, get_produits_by_references(utilisateur, panier)
+            )
 
             return JsonResponse({
                 'success': True,
@@ -436,8 +456,9 @@ def vider_panier(request):
             - panier_count : 0
         HttpResponse (sinon) : Redirection vers 'commandes:panier'
     """
-    request.session['panier'] = {}
-    request.session.modified = True
+    # Session sauvegardée seulement si le panier contenait des articles
+    if request.session.get('panier'):
+        request.session['panier'] = {}
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({
@@ -488,13 +509,13 @@ def valider_commande(request):
         3. Stockage des métadonnées en session (dates, commentaires)
         4. Affichage du récapitulatif pour validation
         5. Création de la commande en base de données
-        6. Génération du fichier CSV EDI pour l'ERP
+        6. Génération du fichier CSV EDI pour l'ERP (en arrière-plan)
         7. Envoi de l'email de confirmation au client
         8. Vidage du panier et redirection
 
     Note:
-        Les messages de debug (print) sont présents pour le développement.
-        En production, utiliser un système de logging approprié.
+        La commande est journalisée par envoyer_commande ; l'envoi de
+        l'email de confirmation est journalisé via le logger du module.
     """
     utilisateur = request.user.utilisateur
     client_distant = get_client_distant(utilisateur.code_tiers)
@@ -512,21 +533,7 @@ def valider_commande(request):
         recap = request.session.get('commande_recap')
         if recap:
             # Reconstruction des lignes pour l'affichage
-            lignes = []
-            total = 0
-            for reference, quantite in panier.items():
-                produit = get_produit_by_reference(utilisateur, reference)
-                if produit:
-                    ligne_total = produit['prix'] * quantite
-                    lignes.append({
-                        'reference': reference,
-                        'nom': produit['nom'],
-                        'prix': produit['prix'],
-                        'unite': produit.get('unite', ''),
-                        'quantite': quantite,
-                        'total': ligne_total,
-                    })
-                    total += ligne_total
+            lignes, total = construire_lignes_commande(utilisateur, panier)
 
             context = {
                 'lignes': lignes,
@@ -544,21 +551,7 @@ def valider_commande(request):
     # TRAITEMENT POST : Préparation ou confirmation
     # =========================================================================
     # Construction des lignes de commande
-    lignes = []
-    total = 0
-    for reference, quantite in panier.items():
-        produit = get_produit_by_reference(utilisateur, reference)
-        if produit:
-            ligne_total = produit['prix'] * quantite
-            lignes.append({
-                'reference': reference,
-                'nom': produit['nom'],
-                'prix': produit['prix'],
-                'unite': produit.get('unite', ''),
-                'quantite': quantite,
-                'total': ligne_total,
-            })
-            total += ligne_total
+    lignes, total = construire_lignes_commande(utilisateur, panier)
 
     # Distinction entre demande de récap et confirmation finale
     if 'confirmer' in request.POST:
@@ -613,57 +606,41 @@ def valider_commande(request):
         'date_livraison': date_livraison,
     }
 
-    # Debug : Affichage de la commande dans le terminal
-    print("\n" + "="*60)
-    print("NOUVELLE COMMANDE REÇUE")
-    print("="*60)
-    print(f"Client: {nom_client}")
-    print(f"Date: {__import__('datetime').datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
-    print("-"*60)
-    print("Articles:")
-    for ligne in lignes:
-        print(f"  - {ligne['nom']} ({ligne['reference']})")
-        print(f"    Qté: {ligne['quantite']} x {ligne['prix']:.2f} € = {ligne['total']:.2f} €")
-    print("-"*60)
-    print(f"TOTAL HT: {total:.2f} €")
-    if notes:
-        print(f"Notes: {notes}")
-    print("="*60 + "\n")
-
     # Envoi au système externe (logiciel métier)
     try:
         resultat = envoyer_commande(commande_data)
 
-        # Création de la commande en base de données
-        commande = Commande.objects.create(
-            utilisateur=utilisateur,
-            numero=Commande.generer_numero(),
-            date_livraison=date_livraison,
-            date_depart_camions=date_depart_camions,
-            total_ht=Decimal(str(total)),
-            commentaire=notes
-        )
-
-        # Création des lignes de commande associées
-        for ligne in lignes:
-            LigneCommande.objects.create(
-                commande=commande,
-                reference_produit=ligne['reference'],
-                nom_produit=ligne['nom'],
-                quantite=ligne['quantite'],
-                prix_unitaire=Decimal(str(ligne['prix'])),
-                total_ligne=Decimal(str(ligne['total']))
+        # Création de la commande et de ses lignes en une seule transaction
+        with transaction.atomic():
+            commande = Commande.objects.create(
+                utilisateur=utilisateur,
+                numero=Commande.generer_numero(),
+                date_livraison=date_livraison,
+                date_depart_camions=date_depart_camions,
+                total_ht=total,
+                commentaire=notes
             )
 
-        # Génération du fichier CSV EDI pour l'ERP
-        try:
-            csv_path = generer_csv_edi(commande, client_distant, lignes)
-            print(f"Fichier EDI généré: {csv_path}")
-            messages.info(request, f"Fichier EDI généré: {csv_path}")
-        except Exception as e:
-            error_msg = f"Erreur génération EDI: {e}\n{traceback.format_exc()}"
-            print(error_msg)
-            messages.warning(request, f"Erreur génération EDI: {e}")
+            # Création des lignes de commande associées en un seul INSERT
+            # (bulk_create n'appelle pas save() : total_ligne est fourni ici)
+            LigneCommande.objects.bulk_create([
+                LigneCommande(
+                    commande=commande,
+                    reference_produit=ligne['reference'],
+                    nom_produit=ligne['nom'],
+                    quantite=ligne['quantite'],
+                    prix_unitaire=ligne['prix'],
+                    total_ligne=ligne['total'],
+                )
+                for ligne in lignes
+            ], batch_size=500)
+
+        # Les produits favoris de l'utilisateur doivent être recalculés
+        invalider_top_references(utilisateur.id)
+
+        # Génération du fichier CSV EDI pour l'ERP, en arrière-plan : en cas
+        # d'échec, la commande reste en attente et sera reprise par `regenerer_edi`
+        lancer_generation_edi(commande.id)
 
         # =====================================================================
         # ENVOI DE L'EMAIL DE CONFIRMATION
@@ -703,9 +680,9 @@ L'équipe Giffaud Groupe"""
                     recipient_list=[email_utilisateur],
                     fail_silently=False,
                 )
-                print(f"Email de confirmation envoyé à {email_utilisateur}")
-            except Exception as e:
-                print(f"Erreur envoi email: {e}")
+                logger.info("Email de confirmation envoyé à %s", email_utilisateur)
+            except Exception:
+                logger.exception("Erreur envoi email de confirmation à %s", email_utilisateur)
 
         # Nettoyage : vidage du panier et des données de session
         request.session['panier'] = {}
@@ -771,10 +748,10 @@ def historique_commandes(request):
     utilisateur = request.user.utilisateur
     client_distant = get_client_distant(utilisateur.code_tiers)
 
-    # Récupération des 50 dernières commandes
+    # Récupération des 50 dernières commandes (nombre de lignes agrégé)
     commandes = Commande.objects.filter(
         utilisateur=utilisateur
-    ).order_by('-date_commande')[:50]
+    ).annotate(nb_lignes=Count('lignes')).order_by('-date_commande')[:50]
 
     return render(request, 'cote_client/commandes/historique.html', {
         'client': client_distant,
@@ -816,9 +793,10 @@ def details_commande(request, commande_id):
     utilisateur = request.user.utilisateur
     client_distant = get_client_distant(utilisateur.code_tiers)
 
-    # Récupération sécurisée de la commande (vérifie l'appartenance)
+    # Récupération sécurisée de la commande (vérifie l'appartenance),
+    # lignes chargées en une requête pour le tableau et le total d'articles
     commande = get_object_or_404(
-        Commande,
+        Commande.objects.prefetch_related('lignes'),
         id=commande_id,
         utilisateur=utilisateur
     )
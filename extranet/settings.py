@@ -98,6 +98,7 @@ TEMPLATES = [
 
                 # Processeurs de contexte personnalisés
                 'commandes.context_processors.panier_count',    # Nombre d'articles dans le panier
+                'catalogue.context_processors.panier_recap',    # Récapitulatif du panier (lignes, total)
             ],
         },
     },
@@ -130,6 +131,11 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_LOGIGVD_PASSWORD', ''),
         'HOST': os.getenv('DB_LOGIGVD_HOST', ''),
         'PORT': os.getenv('DB_LOGIGVD_PORT', '3306'),
+        # Connexion persistante : la base distante est interrogée sur la
+        # plupart des pages, la connexion est réutilisée entre les requêtes
+        # (vérifiée avant réutilisation) au lieu d'être rouverte à chaque fois
+        'CONN_MAX_AGE': int(os.getenv('DB_LOGIGVD_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
         'OPTIONS': {
             'charset': 'utf8mb4',  # Support des caractères spéciaux et emojis
         },
@@ -140,6 +146,17 @@ DATABASES = {
 # Dirige automatiquement les requêtes vers la bonne base selon le modèle
 DATABASE_ROUTERS = ['extranet.db_router.DatabaseRouter']
 
+# =============================================================================
+# AUTHENTIFICATION
+# =============================================================================
+# Le backend client charge le profil Utilisateur avec le User (une requête
+# de moins par page). ModelBackend reste listé pour les sessions ouvertes
+# avant son ajout.
+AUTHENTICATION_BACKENDS = [
+    'clients.backends.UtilisateurBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 # =============================================================================
 # VALIDATION DES MOTS DE PASSE
 # =============================================================================
@@ -198,15 +215,32 @@ CSRF_TRUSTED_ORIGINS = [
 # =============================================================================
 # CACHE
 # =============================================================================
-# Cache en mémoire locale pour les filtres et données fréquentes
-# En production, utiliser Redis : 'django.core.cache.backends.redis.RedisCache'
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-        'TIMEOUT': 300,  # 5 minutes par défaut
+# Cache en mémoire locale pour les filtres et données fréquentes (catalogues clients)
+# En production, définir REDIS_URL pour partager le cache entre les processus
+# (nécessite le paquet redis)
+REDIS_URL = os.getenv('REDIS_URL', '')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'TIMEOUT': 300,  # 5 minutes par défaut
+        }
+    }
+    # Sessions (panier) lues depuis le cache partagé, la base ne sert que
+    # de persistance : plus de SELECT de session à chaque requête.
+    # Pas avec le cache local, propre à chaque processus : un processus
+    # pourrait relire un panier périmé.
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unique-snowflake',
+            'TIMEOUT': 300,  # 5 minutes par défaut
+        }
     }
-}
 
 # =============================================================================
 # CONFIGURATION EMAIL
@@ -24,7 +24,7 @@ Projet : Extranet Giffaud Groupe
 
 from django.db.models import Count, Sum
 from .models import HistoriqueAchat, PreferenceCategorie
-from catalogue.services import get_produits_client, get_produit_by_reference
+from catalogue.services import get_produits_client, get_produits_by_references
 
 
 def obtenir_produits_favoris(utilisateur, limite=4):
@@ -52,19 +52,18 @@ def obtenir_produits_favoris(utilisateur, limite=4):
         >>> for p in favoris:
         ...     print(f"{p['nom']} - {p['prix']}€")
     """
-    # Récupération de l'historique trié par fréquence d'achat
-    historique = HistoriqueAchat.objects.filter(
-        utilisateur=utilisateur
-    ).order_by('-nombre_commandes', '-quantite_totale')[:limite]
-
-    # Enrichissement avec les données produit de la base distante
-    produits_favoris = []
-    for h in historique:
-        produit = get_produit_by_reference(utilisateur, h.reference_produit)
-        if produit:
-            produits_favoris.append(produit)
+    # Récupération des références triées par fréquence d'achat
+    references = list(
+        HistoriqueAchat.objects
+        .filter(utilisateur=utilisateur)
+        .order_by('-nombre_commandes', '-quantite_totale')
+        .values_list('reference_produit', flat=True)[:limite]
+    )
 
-    return produits_favoris
+    # Enrichissement avec les données produit du catalogue du client,
+    # résolues en un seul accès pour toutes les références
+    produits = get_produits_by_references(utilisateur, references)
+    return [produits[ref] for ref in references if ref in produits]
 
 
 def obtenir_recommandations(utilisateur, limite=8):
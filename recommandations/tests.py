@@ -7,16 +7,20 @@ Tests couverts :
     - Modeles : HistoriqueAchat, PreferenceCategorie
     - Vues : acces aux pages et APIs
     - Methode : enregistrer_achat
+    - Services : obtenir_produits_favoris
 
 Projet : Extranet Giffaud Groupe
 =============================================================================
 """
+from unittest.mock import patch
+
 from django.test import TestCase
 from django.contrib.auth.models import User
 from django.urls import reverse
 
 from clients.models import Utilisateur
 from .models import HistoriqueAchat, PreferenceCategorie
+from .services import obtenir_produits_favoris
 
 
 # =============================================================================
@@ -127,6 +131,31 @@ class PreferenceCategorieModelTest(TestCase):
         self.assertIn('CLI001', str(pref))
 
 
+# =============================================================================
+# TESTS DES SERVICES
+# =============================================================================
+
+class ProduitsFavorisTest(TestCase):
+    """Tests de obtenir_produits_favoris."""
+
+    def setUp(self):
+        self.user, self.utilisateur = creer_utilisateur()
+        HistoriqueAchat.enregistrer_achat(self.utilisateur, 'PROD001', 5)
+        HistoriqueAchat.enregistrer_achat(self.utilisateur, 'PROD002', 3)
+        HistoriqueAchat.enregistrer_achat(self.utilisateur, 'PROD002', 3)
+        HistoriqueAchat.enregistrer_achat(self.utilisateur, 'PROD003', 1)
+
+    @patch('recommandations.services.get_produits_by_references')
+    def test_ordre_et_references_absentes(self, mock_produits):
+        mock_produits.return_value = {
+            'PROD001': {'reference': 'PROD001'},
+            'PROD002': {'reference': 'PROD002'},
+        }
+        favoris = obtenir_produits_favoris(self.utilisateur, limite=3)
+        self.assertEqual([p['reference'] for p in favoris], ['PROD002', 'PROD001'])
+        mock_produits.assert_called_once_with(self.utilisateur, ['PROD002', 'PROD001', 'PROD003'])
+
+
 # =============================================================================
 # TESTS DES VUES
 # =============================================================================
@@ -24,16 +24,16 @@ Algorithme de recommandation :
 Projet : Extranet Giffaud Groupe
 =============================================================================
 """
-from django.shortcuts import render, redirect
+from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.contrib import messages
 from django.http import JsonResponse
+from clients.decorators import utilisateur_required
 from .services import obtenir_recommandations, obtenir_produits_favoris
-from catalogue.services import get_categories_client, get_produit_by_reference
 from administration.views.utils.filtres import preparer_filtres, appliquer_filtres
 
 
 @login_required
+@utilisateur_required
 def mes_recommandations(request):
     """
     Affiche la page des recommandations personnalisées.
@@ -44,6 +44,7 @@ def mes_recommandations(request):
 
     Décorateurs :
         @login_required : Redirige vers la connexion si non authentifié
+        @utilisateur_required : Redirige vers la connexion sans profil utilisateur
 
     Args:
         request (HttpRequest): L'objet requête Django contenant :
@@ -57,34 +58,24 @@ def mes_recommandations(request):
             - Sinon : Rendu du template 'cote_client/recommandations/liste.html'
               avec le contexte :
               - recommandations : Liste des produits recommandés
-              - categories : Catégories disponibles pour l'utilisateur
               - filtres_groupes : Groupes de filtres disponibles
               - filtres_actifs : Filtres actuellement appliqués
               - recherche : Terme de recherche actuel
-              - lignes_panier : Détail des lignes du panier
-              - total_panier : Montant total du panier
+              - lignes_panier, total_panier : fournis par le context processor
+                catalogue.context_processors.panier_recap
 
     Note:
         Les recommandations sont calculées dynamiquement à chaque affichage.
         Le seuil de 2 occurrences pour les filtres automatiques est plus
         bas que pour le catalogue car il y a moins de produits affichés.
     """
-    # Vérification du profil utilisateur
-    if not hasattr(request.user, 'utilisateur'):
-        messages.error(
-            request,
-            "Votre compte n'est pas associé à un profil utilisateur."
-        )
-        return redirect('clients:connexion')
-
-    utilisateur = request.user.utilisateur
+    utilisateur = request.utilisateur
 
     # =========================================================================
     # CALCUL DES RECOMMANDATIONS
     # =========================================================================
     # Obtention des 12 produits recommandés via l'algorithme du service
     recommandations = obtenir_recommandations(utilisateur, limite=12)
-    categories = get_categories_client(utilisateur)
 
     # =========================================================================
     # PRÉPARATION DES FILTRES
@@ -103,36 +94,12 @@ def mes_recommandations(request):
     # Application des filtres et de la recherche
     recommandations = appliquer_filtres(recommandations, filtres_actifs, recherche)
 
-    # =========================================================================
-    # RÉCUPÉRATION DU PANIER POUR LE RÉCAPITULATIF
-    # =========================================================================
-    # Le récapitulatif du panier est affiché dans le bandeau latéral
-    panier = request.session.get('panier', {})
-    lignes_panier = []
-    total_panier = 0
-
-    for reference, quantite in panier.items():
-        produit = get_produit_by_reference(utilisateur, reference)
-        if produit:
-            ligne_total = produit['prix'] * quantite
-            lignes_panier.append({
-                'reference': reference,
-                'nom': produit['nom'],
-                'quantite': quantite,
-                'prix': produit['prix'],
-                'total': ligne_total,
-            })
-            total_panier += ligne_total
-
     # Préparation du contexte pour le template
     context = {
         'recommandations': recommandations,
-        'categories': categories,
         'filtres_groupes': filtres_groupes,
         'filtres_actifs': filtres_actifs,
         'recherche': request.GET.get('q', ''),
-        'lignes_panier': lignes_panier,
-        'total_panier': total_panier,
     }
     return render(request, 'cote_client/recommandations/liste.html', context)
 